@@ -0,0 +1,91 @@
+"""Message throughput of the per-pattern loop versus `PatternSet`.
+
+Run from the repository root with `python -m benchmarks.match_throughput`.
+"""
+
+import random
+import re
+import string
+import time
+
+from utils.umatch import PatternSet
+
+RULE_COUNTS = (10, 100, 1000)
+MESSAGE_COUNT = 2000
+
+def random_word(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+def build_rules(rng: random.Random, count: int) -> list[tuple[int, str]]:
+    rules = []
+
+    for rule_id in range(count):
+        word = random_word(rng, rng.randint(5, 9))
+
+        match rule_id % 3:
+            case 0: pattern = word
+            case 1: pattern = r"\b{}s?\b".format(word)
+            case _: pattern = "{}[ _-]?{}".format(word[:3], word[3:])
+
+        rules.append((rule_id, pattern))
+
+    return rules
+
+def build_messages(rng: random.Random, rules: list[tuple[int, str]]) -> list[str]:
+    messages = []
+
+    for index in range(MESSAGE_COUNT):
+        words = [random_word(rng, rng.randint(2, 8)) for _ in range(rng.randint(5, 40))]
+
+        # Roughly one message in twenty trips a rule
+        if index % 20 == 0:
+            words.append(re.sub(r"\\b|s\?|\[ _-\]\?", "", rng.choice(rules)[1]))
+
+        messages.append(" ".join(words))
+
+    return messages
+
+def per_pattern(rules: list[tuple[int, str]], messages: list[str]) -> int:
+    hits = 0
+
+    for content in messages:
+        for _, pattern in rules:
+            if re.search(pattern, content, re.IGNORECASE):
+                hits += 1
+                break
+
+    return hits
+
+def pattern_set(rules: list[tuple[int, str]], messages: list[str]) -> int:
+    matcher = PatternSet(rules)
+    hits = 0
+
+    for content in messages:
+        if matcher.search(content):
+            hits += 1
+
+    return hits
+
+def measure(function, rules, messages) -> tuple[float, int]:
+    start = time.perf_counter()
+    hits = function(rules, messages)
+    return len(messages) / (time.perf_counter() - start), hits
+
+def main():
+    rng = random.Random(0)
+
+    print("{:>6} | {:>18} | {:>18} | {:>7}".format("rules", "per-pattern msg/s", "PatternSet msg/s", "speedup"))
+
+    for count in RULE_COUNTS:
+        rules = build_rules(rng, count)
+        messages = build_messages(rng, rules)
+
+        baseline, baseline_hits = measure(per_pattern, rules, messages)
+        combined, combined_hits = measure(pattern_set, rules, messages)
+
+        assert baseline_hits == combined_hits, "matchers disagree ({} vs {})".format(baseline_hits, combined_hits)
+
+        print("{:>6} | {:>18.0f} | {:>18.0f} | {:>6.1f}x".format(count, baseline, combined, combined / baseline))
+
+if __name__ == "__main__":
+    main()
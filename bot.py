@@ -1,13 +1,15 @@
-from datetime import datetime
+import asyncio
 import json
 import os
+import time
 
 import discord
 from discord.ext import commands
 import logging
-from cogs.commands.reminder import schedule_reminder
 
-from db.models import MemberReminder, db_main
+from db.models import db_main
+from utils.umatch import regex_guard
+from utils.uscheduler import scheduler
 
 with open('./config.json', 'r') as config_json:
     config = json.load(config_json)
@@ -29,6 +31,12 @@ with open('./config.json', 'r') as config_json:
         config['db_database'] = os.getenv("DB_DATABASE")
     if "DB_PASSWORD" in os.environ:
         config['db_password'] = os.getenv("DB_PASSWORD")
+    if "TAG_COOLDOWN" in os.environ:
+        config['tag_cooldown'] = float(os.getenv("TAG_COOLDOWN"))
+    if "MESSAGE_STORE_MB" in os.environ:
+        config['message_store_mb'] = float(os.getenv("MESSAGE_STORE_MB"))
+    if "VOTE_FLUSH_INTERVAL" in os.environ:
+        config['vote_flush_interval'] = float(os.getenv("VOTE_FLUSH_INTERVAL"))
 
 logger = logging.getLogger()
 
@@ -44,26 +52,45 @@ class IBpy(commands.Bot):
             intents=intents, 
             command_prefix=config['prefix'],
             description=config['description'],
-            application_id=config['application_id']
+            application_id=config['application_id'],
+            # Edit/delete logging keeps its own compact store (see MessageListener)
+            max_messages=None,
+            # Sent with every identify, so reconnects keep it without a change_presence call
+            activity=discord.Game(name="{}help".format(config['prefix'])),
+            status=discord.Status.do_not_disturb
         )
-    
-    async def on_ready(self):
-        await bot.change_presence(activity=discord.Game(name="{}help".format(config['prefix'])), status=discord.Status.do_not_disturb)
-        await db_main()
+        self.config = config
+        self.startup_timings: dict[str, float] = {}
 
-        bot_name = bot.user.name
-        bot_description = bot.description
-        guild_number = len(bot.guilds)
+    async def setup_hook(self):
+        """Runs once before the first gateway connection, unlike `on_ready`, which fires again on every reconnect."""
 
-        logger.info("Bot \"{}\" is now connected.".format(bot_name))
-        logger.info("Currently serving {} guilds.".format(guild_number))
-        logger.info("Described as \"{}\".".format(bot_description))
-        
+        start = time.perf_counter()
+
+        # Cogs only touch the database once the bot is ready, so neither phase waits on the other
+        await asyncio.gather(
+            self.timed("database", db_main()),
+            self.timed("extensions", self.load_extensions()),
+            self.timed("regex workers", regex_guard.start()),
+        )
+
+        self.startup_timings["total"] = time.perf_counter() - start
+
+        logger.info("Startup took {}.".format(", ".join("{} {:.2f}s".format(phase, seconds) for phase, seconds in self.startup_timings.items())))
+
+        asyncio.create_task(self.start_scheduler())
+
+    async def timed(self, phase: str, coroutine):
+        start = time.perf_counter()
+        await coroutine
+        self.startup_timings[phase] = time.perf_counter() - start
+
+    async def load_extensions(self):
         for folder, _, files in os.walk('./cogs'):
             for filename in files:
                 if filename.endswith('.py'):
                     try:
-                        await bot.load_extension(os.path.join(folder, filename).replace('\\', '.').replace('/', '.')[2:-3])
+                        await self.load_extension(os.path.join(folder, filename).replace('\\', '.').replace('/', '.')[2:-3])
                     except commands.errors.NoEntryPointError as e:
                         # ! Remove before push
                         print(e)
@@ -71,15 +98,24 @@ class IBpy(commands.Bot):
         
         logger.info("Loaded all cogs.")
 
-        date_now = datetime.utcnow()
-        reminders_list = await MemberReminder.query.where(MemberReminder.time > date_now).gino.all()
+    async def start_scheduler(self):
+        # Job handlers resolve guilds, channels and users from the cache, which fills on ready
+        await self.wait_until_ready()
+        scheduler.start()
 
-        for reminder in reminders_list:
-            user = bot.get_user(reminder.user_id)
-            await schedule_reminder(user, reminder.time, reminder.text)
-        
-        logger.info("Scheduled all reminders.")
+        logger.info("Started the scheduler.")
+    
+    async def on_ready(self):
+        bot_name = bot.user.name
+        bot_description = bot.description
+        guild_number = len(bot.guilds)
+
+        logger.info("Bot \"{}\" is now connected.".format(bot_name))
+        logger.info("Currently serving {} guilds.".format(guild_number))
+        logger.info("Described as \"{}\".".format(bot_description))
 
-bot = IBpy()
+# Regex worker processes run this script as `__mp_main__`, and must not start a second bot
+if __name__ == "__main__":
+    bot = IBpy()
 
-bot.run(config['token'])
\ No newline at end of file
+    bot.run(config['token'])
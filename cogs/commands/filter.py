@@ -1,4 +1,5 @@
 from discord.ext import commands
+from db.cache import filter_cache
 from db.models import StaffFilter
 
 from pagination.pagination import Pagination
@@ -35,7 +36,7 @@ class Filter(commands.Cog):
     @mods_or_manage_guild()
     @commands.guild_only()
     async def filter_create(self, ctx: commands.Context, *, pattern: str):
-        assert_regex(pattern)
+        regex_warning = await assert_regex(pattern)
         
         try:
             filtered_message = await StaffFilter.query.where(StaffFilter.trigger == pattern).gino.first()
@@ -46,10 +47,14 @@ class Filter(commands.Cog):
 
             filtered_message = StaffFilter(trigger=pattern)
             await filtered_message.create()
+            filter_cache.add(filtered_message)
         except Exception as e:
             print(e)
             
         await ctx.send("The pattern (`{}`) has been successfully added to filter.".format(pattern))
+
+        if regex_warning:
+            await ctx.send(regex_warning)
     
     @filter.command(name='remove', aliases=['delete'])
     @mods_or_manage_guild()
@@ -63,6 +68,7 @@ class Filter(commands.Cog):
                 return
 
             await filtered_message.delete()
+            filter_cache.remove(filtered_message.filter_id)
         except Exception as e:
             print(e)
 
@@ -80,6 +86,7 @@ class Filter(commands.Cog):
         
         try:
             await filtered_message.update(notify = not filtered_message.notify).apply()
+            filter_cache.update(filtered_message)
         except Exception as e:
             print(e)
             return
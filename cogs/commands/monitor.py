@@ -1,6 +1,7 @@
 from discord.ext import commands
 import discord
 
+from db.cache import monitor_cache
 from db.models import StaffMonitorMessage, StaffMonitorUser
 from pagination.pagination import Pagination
 from utils.ucommand import reply_unknown_syntax
@@ -89,6 +90,7 @@ class Monitor(commands.Cog):
 
             monitored_user = StaffMonitorUser(user_id=user.id)
             await monitored_user.create()
+            monitor_cache.add_user(user.id)
         except Exception as e:
             print(e)
 
@@ -106,6 +108,7 @@ class Monitor(commands.Cog):
                 return
 
             await monitored_user.delete()
+            monitor_cache.remove_user(user.id)
         except Exception as e:
             print(e)
 
@@ -121,7 +124,7 @@ class Monitor(commands.Cog):
     @mods_or_manage_guild()
     @commands.guild_only()
     async def message_create(self, ctx: commands.Context, *, pattern: str):
-        assert_regex(pattern)
+        regex_warning = await assert_regex(pattern)
         
         try:
             monitored_message = await StaffMonitorMessage.query.where(StaffMonitorMessage.message == pattern).gino.first()
@@ -132,10 +135,14 @@ class Monitor(commands.Cog):
 
             monitored_message = StaffMonitorMessage(message=pattern)
             await monitored_message.create()
+            monitor_cache.add_message(monitored_message)
         except Exception as e:
             print(e)
             
         await ctx.send("The pattern (`{}`) has been successfully added to monitor.".format(pattern))
+
+        if regex_warning:
+            await ctx.send(regex_warning)
     
     @message.command(name='remove', aliases=['delete'])
     @mods_or_manage_guild()
@@ -149,6 +156,7 @@ class Monitor(commands.Cog):
                 return
 
             await monitored_message.delete()
+            monitor_cache.remove_message(monitored_message.monitor_message_id)
         except Exception as e:
             print(e)
 
@@ -165,6 +173,7 @@ class Monitor(commands.Cog):
         for user in monitor_users:
             if user.user_id not in guild_members:
                 await user.delete()
+                monitor_cache.remove_user(user.user_id)
                 users_removed += 1
             
         await ctx.send("{} user(s) were removed from monitor.".format(users_removed))
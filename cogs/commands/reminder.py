@@ -3,9 +3,11 @@ from datetime import datetime
 from discord.ext import commands
 import discord
 from discord import app_commands
-from db.models import MemberReminder
+from db.models import GuildScheduledJob, MemberReminder
 from pagination.pagination import Pagination
 
+from utils.udm import dm_dispatcher
+from utils.uscheduler import scheduler
 from utils.utime import parse_duration
 
 class Reminder(commands.GroupCog, name = "reminder"):
@@ -17,21 +19,21 @@ class Reminder(commands.GroupCog, name = "reminder"):
     @app_commands.guild_only()
     async def reminder_create(self, interaction: discord.Interaction, date: str, reminder: str):
         timestamp = parse_duration(date)
-        await MemberReminder.create(text=reminder, time=timestamp, user_id=interaction.user.id)
+        reminder_entry = await MemberReminder.create(text=reminder, time=timestamp, user_id=interaction.user.id)
+        await schedule_reminder(reminder_entry)
 
         await interaction.response.send_message("Reminder has been set. You will be notifed at <t:{}>.".format(int(timestamp.timestamp())))
-
-        await schedule_reminder(interaction.user, timestamp, reminder)
     
     @app_commands.command(name = "delete", description="Deletes a reminder.")
     @app_commands.guild_only()
     async def reminder_delete(self, interaction: discord.Interaction, id: int):
         reminder = await MemberReminder.get(id)
 
-        if reminder.user_id != interaction.user.id or reminder.time > datetime.utcnow():
-            await interaction.response.send("Cannot delete reminder due to invalid ID.")
+        if not reminder or reminder.user_id != interaction.user.id or reminder.time < datetime.utcnow():
+            await interaction.response.send_message("Cannot delete reminder due to invalid ID.")
             return
 
+        # Its scheduled job finds no reminder when it fires, so nothing is sent
         await reminder.delete()
 
         await interaction.response.send_message("Reminder with ID {} has been deleted.".format(id))
@@ -54,9 +56,26 @@ class Reminder(commands.GroupCog, name = "reminder"):
         
         await interaction.response.send_message(embed=reminders_embed)
 
-async def schedule_reminder(user: discord.User, timestamp: datetime, reminder: str):
-    await asyncio.sleep(int(timestamp.timestamp()) - int(datetime.utcnow().timestamp()))
-    await user.send("You asked me to remind you of: {}".format(reminder))
+    async def cog_load(self):
+        scheduler.register("reminder", self.send_reminders)
+
+    async def send_reminders(self, jobs: list[GuildScheduledJob]) -> list[GuildScheduledJob]:
+        reminder_ids = [job.payload["reminder_id"] for job in jobs]
+        reminders = {reminder.reminder_id: reminder for reminder in await MemberReminder.query.where(MemberReminder.reminder_id.in_(reminder_ids)).gino.all()}
+
+        # Jobs whose reminder was deleted meanwhile have nothing left to send
+        jobs = [job for job in jobs if job.payload["reminder_id"] in reminders]
+        results = await asyncio.gather(*(self.send_reminder(reminders[job.payload["reminder_id"]]) for job in jobs), return_exceptions=True)
+
+        # Only the failed ones are retried, so nobody is reminded twice
+        return [job for job, result in zip(jobs, results) if isinstance(result, Exception)]
+
+    async def send_reminder(self, reminder: MemberReminder):
+        user = self.bot.get_user(reminder.user_id) or await self.bot.fetch_user(reminder.user_id)
+        dm_dispatcher.send(user, "You asked me to remind you of: {}".format(reminder.text))
+
+async def schedule_reminder(reminder: MemberReminder):
+    await scheduler.schedule("reminder", reminder.time, {"reminder_id": reminder.reminder_id})
         
 async def setup(bot: commands.Bot):
     await bot.add_cog(Reminder(bot))
\ No newline at end of file
@@ -1,5 +1,6 @@
 from discord.ext import commands
 import discord
+from db.cache import tag_cache
 from db.models import StaffTag
 
 from pagination.pagination import Pagination
@@ -28,17 +29,21 @@ class Tag(commands.Cog):
     @mods_or_manage_guild()
     @commands.guild_only()
     async def tag_create(self, ctx: commands.Context, trigger: str, value: str):
-        assert_regex(trigger)
         assert_length(trigger, 256, "The tag trigger is too long. It is currently {} characters long (must be a maximum of 256).".format(len(trigger)))
         assert_length(value, 1024, "The tag value is too long. It is currently {} characters long (must be a maximum of 1024).".format(len(value)))
+        regex_warning = await assert_regex(trigger)
 
         try:
             tag = StaffTag(trigger=trigger, output=value, disabled=False)
             await tag.create()
+            tag_cache.add(tag)
         except Exception as e:
             print(e)
             
         await ctx.send("Consider it done: `{}` -> `{}`.".format(trigger, value))
+
+        if regex_warning:
+            await ctx.send(regex_warning)
     
     @tag.command(name='remove', aliases=['delete'])
     @mods_or_manage_guild()
@@ -52,6 +57,7 @@ class Tag(commands.Cog):
                 return
 
             await tag.delete()
+            tag_cache.remove(tag.tag_id)
         except Exception as e:
             print(e)
 
@@ -69,6 +75,7 @@ class Tag(commands.Cog):
                 return
 
             await tag.update(disabled = not tag.disabled).apply()
+            tag_cache.update(tag)
         except Exception as e:
             print(e)
             return
@@ -80,8 +87,9 @@ class Tag(commands.Cog):
     @tag.command(name='find')
     @commands.guild_only()
     async def tag_find(self, ctx: commands.Context, pattern: str, escape = "-"):
-        tags = await StaffTag.query.gino.all()
-        matches = [tag.trigger for tag in tags if pattern.lower() in str(tag.trigger).lower()]
+        await tag_cache.ensure_loaded()
+
+        matches = [tag.trigger for tag in tag_cache.find(pattern)]
         tag_matches_step = 15
         
         if escape == "-escape":
@@ -101,9 +109,11 @@ class Tag(commands.Cog):
     @tag.command(name='list')
     @commands.guild_only()
     async def tag_list(self, ctx: commands.Context):
+        await tag_cache.ensure_loaded()
+
         tags = []
 
-        for tag in await StaffTag.query.gino.all():
+        for tag in tag_cache.tags.values():
             tags.append({
                 "trigger": tag.trigger,
                 "value": tag.output,
@@ -113,6 +123,30 @@ class Tag(commands.Cog):
 
         await ctx.send(embed=tag_embed, view=tag_view)
     
+    @tag.command(name='stats')
+    @mods_or_manage_guild()
+    @commands.guild_only()
+    async def tag_stats(self, ctx: commands.Context):
+        await tag_cache.ensure_loaded()
+
+        message_listener = self.bot.get_cog("MessageListener")
+        cooldowns = message_listener.tag_cooldowns if message_listener else None
+        stats = []
+
+        if cooldowns:
+            tag_ids = sorted(cooldowns.sent.keys() | cooldowns.suppressed.keys(), key=lambda tag_id: -(cooldowns.sent[tag_id] + cooldowns.suppressed[tag_id]))
+
+            for tag_id in tag_ids:
+                tag = tag_cache.tags.get(tag_id)
+                stats.append({
+                    "trigger": tag.trigger if tag else "Removed tag #{}".format(tag_id),
+                    "value": "{} sent, {} suppressed by cooldown".format(cooldowns.sent[tag_id], cooldowns.suppressed[tag_id]),
+                })
+
+        tag_embed, tag_view = await TagListPagination(ctx, stats, "Here are the tag reply counts since startup.", 10).return_paginated_embed()
+
+        await ctx.send(embed=tag_embed, view=tag_view)
+    
     async def cog_command_error(self, ctx, error: commands.CommandError):
         # ! More robust error checking
         await ctx.send(error)
@@ -3,10 +3,13 @@ from datetime import datetime
 from discord.ext import commands
 import discord
 from discord import app_commands
-from db.models import GuildVote, GuildVoteLadder
+from db.cache import active_vote_cache, vote_ladder_cache
+from db.models import GuildScheduledJob, GuildVote, GuildVoteLadder
 from pagination.pagination import Pagination
 
+from utils.uscheduler import scheduler
 from utils.utime import parse_duration
+from utils.uvote import DOWNVOTE, UPVOTE
 
 class VoteLadderListPagination(Pagination):
     def build_field(self, embed: discord.Embed, index, value):
@@ -21,13 +24,14 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_create(self, interaction: discord.Interaction, ladder_name: str):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if vote_ladder:
             await interaction.response.send_message("A voteladder with that name already exists.")
             return
         
-        await GuildVoteLadder.create(ladder_label=ladder_name.lower())
+        vote_ladder_cache.add(await GuildVoteLadder.create(ladder_label=ladder_name.lower()))
 
         await interaction.response.send_message("The voteladder \" {} \" has been created.".format(ladder_name.lower()))
     
@@ -35,13 +39,15 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_delete(self, interaction: discord.Interaction, ladder_name: str):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
             return
 
         await vote_ladder.delete()
+        vote_ladder_cache.remove(vote_ladder.ladder_id)
 
         await interaction.response.send_message("The voteladder \" {} \" has been deleted.".format(ladder_name.lower()))
 
@@ -49,9 +55,9 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_list(self, interaction: discord.Interaction):
-        voteladders_list = await GuildVoteLadder.query.gino.all()
+        await vote_ladder_cache.ensure_loaded()
 
-        voteladders = [voteladder.ladder_label for voteladder in voteladders_list]
+        voteladders = [voteladder.ladder_label for voteladder in vote_ladder_cache.ladders.values()]
 
         voteladders_embed, voteladders_view = VoteLadderListPagination(interaction, voteladders).return_paginated_embed()
         
@@ -61,7 +67,8 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_channel(self, interaction: discord.Interaction, ladder_name: str, channel: discord.TextChannel):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
@@ -74,7 +81,8 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_duration(self, interaction: discord.Interaction, ladder_name: str, duration: str):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
@@ -89,7 +97,8 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_threshold(self, interaction: discord.Interaction, ladder_name: str, threshold: int = None):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
@@ -102,7 +111,8 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
     async def voteladder_minimum(self, interaction: discord.Interaction, ladder_name: str, minimum: int = None):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
@@ -114,18 +124,32 @@ class VoteLadder(commands.GroupCog, name = "voteladder"):
     @app_commands.command(name = "role", description="Set alternate role for specified voteladder.")
     @commands.has_guild_permissions(manage_guild=True)
     @app_commands.guild_only()
-    async def voteladder_minimum(self, interaction: discord.Interaction, ladder_name: str, role: discord.Role = None):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+    async def voteladder_role(self, interaction: discord.Interaction, ladder_name: str, role: discord.Role = None):
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
 
         if not vote_ladder:
             await interaction.response.send_message("That ladder does not exist.")
             return
         
-        await vote_ladder.update(ladder_role = role.id).apply()
+        await vote_ladder.update(ladder_role = role.id if role else None).apply()
         await interaction.response.send_message("The role for voteladder \" {} \" has been {}.".format(ladder_name.lower(), f"set to f{role.name}" if role else "removed"))
 
+    async def cog_load(self):
+        scheduler.register("vote", self.expire_votes)
+
+    async def expire_votes(self, jobs: list[GuildScheduledJob]) -> list[GuildScheduledJob]:
+        vote_ids = [job.payload["vote_id"] for job in jobs]
+        votes = {vote_entry.vote_id: vote_entry for vote_entry in await GuildVote.query.where(GuildVote.vote_id.in_(vote_ids) & (GuildVote.finished == False)).gino.all()}
+
+        # Votes already finished, e.g. by their threshold, need nothing more
+        jobs = [job for job in jobs if job.payload["vote_id"] in votes]
+        results = await asyncio.gather(*(meets_final_criteria(self.bot, votes[job.payload["vote_id"]]) for job in jobs), return_exceptions=True)
+
+        return [job for job, result in zip(jobs, results) if isinstance(result, Exception)]
+
 async def create_vote(bot: commands.Bot, voteladder: GuildVoteLadder, vote: str) -> GuildVote | None:
-    channel = bot.get_channel(voteladder.channel_id)
+    channel = bot.get_channel(int(voteladder.channel_id)) if voteladder.channel_id else None
 
     if not channel: return None
 
@@ -133,48 +157,80 @@ async def create_vote(bot: commands.Bot, voteladder: GuildVoteLadder, vote: str)
 
     vote_entry = await GuildVote.create(message=vote, ladder_id=voteladder.ladder_id, expiry=expiry)
 
-    message = await channel.send("{}) {}".format(vote.vote_id, vote_entry))
+    message = await channel.send("{}) {}".format(vote_entry.vote_id, vote))
 
     await vote_entry.update(message_id = message.id).apply()
-    await schedule_vote(bot, vote_entry)
+    active_vote_cache.add(vote_entry)
+    await schedule_vote(vote_entry)
 
-    await message.add_reaction("\uD83D\uDC4D")
-    await message.add_reaction("\uD83D\uDC4E")
+    await message.add_reaction(UPVOTE)
+    await message.add_reaction(DOWNVOTE)
 
     return vote_entry
 
-async def schedule_vote(bot: commands.Bot, vote_entry: GuildVote):
-    await asyncio.sleep(vote_entry.expiry - int(datetime.utcnow().timestamp()))
-    await meets_final_criteria(bot, vote_entry)
+async def schedule_vote(vote_entry: GuildVote):
+    # `expiry` comes from `utcnow().timestamp()`, so `fromtimestamp` gives back the naive UTC time
+    await scheduler.schedule("vote", datetime.fromtimestamp(vote_entry.expiry), {"vote_id": vote_entry.vote_id})
+
+def threshold_reached(voteladder: GuildVoteLadder, vote_entry: GuildVote) -> bool:
+    threshold = voteladder.threshold
+
+    return threshold is not None and (vote_entry.positive >= threshold or vote_entry.negative >= threshold)
+
+async def update_vote(bot: commands.Bot, vote_entry: GuildVote):
+    """Checks a vote against its ladder whenever its counters change.
+
+    Args:
+        vote_entry (GuildVote): The vote, with the counts returned by the increment.
+    """
+
+    await vote_ladder_cache.ensure_loaded()
+    voteladder = vote_ladder_cache.get(vote_entry.ladder_id)
+
+    # Finish the moment the threshold is crossed, not at expiry
+    if voteladder and threshold_reached(voteladder, vote_entry):
+        await meets_final_criteria(bot, vote_entry)
 
 async def meets_final_criteria(bot: commands.Bot, vote_entry: GuildVote):
-    if vote_entry.finished:
+    active_vote_cache.remove(vote_entry.message_id)
+
+    # Only one caller flips `finished`, so a threshold crossing racing the expiry announces once.
+    # The returned row also carries the final counts, which the caller's copy may predate.
+    vote_entry = await GuildVote.update \
+        .values(finished=True) \
+        .where((GuildVote.vote_id == vote_entry.vote_id) & (GuildVote.finished == False)) \
+        .returning(*GuildVote.__table__.columns) \
+        .gino.model(GuildVote).first()
+
+    if not vote_entry:
+        return
+
+    await vote_ladder_cache.ensure_loaded()
+    voteladder = vote_ladder_cache.get(vote_entry.ladder_id)
+
+    if not voteladder:
         return
-    
-    voteladder: GuildVoteLadder = await GuildVoteLadder.get(vote_entry.ladder_id)
 
     yes = vote_entry.positive
     no = vote_entry.negative
+    reason = ""
 
-    if yes >= voteladder.threshold or no >= voteladder.threshold or datetime.utcnow().timestamp() > vote_entry.expiry:
-        channel = bot.get_channel(voteladder.channel_id)
-
-        if yes > no:
-            if yes < voteladder.minimum:
-                text = "failed"
-                reason = "Did not meet upvote threshold."
-            else:
-                text = "passed"
-        elif no > yes:
+    if yes > no:
+        if voteladder.minimum is not None and yes < voteladder.minimum:
             text = "failed"
-            reason = "More downvotes than upvotes."
+            reason = "Did not meet upvote threshold."
         else:
-            text = "drew"
-        
-        if channel:
-            await channel.send("Update on vote `{}/{}`: {}. {}".format(voteladder.ladder_label, vote_entry.vote_id, text, reason))
+            text = "passed"
+    elif no > yes:
+        text = "failed"
+        reason = "More downvotes than upvotes."
+    else:
+        text = "drew"
+
+    channel = bot.get_channel(int(voteladder.channel_id)) if voteladder.channel_id else None
 
-    await vote_entry.update(finished = True).apply()
+    if channel:
+        await channel.send("Update on vote `{}/{}`: {}. {}".format(voteladder.ladder_label, vote_entry.vote_id, text, reason))
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(VoteLadder(bot))
\ No newline at end of file
@@ -1,70 +1,61 @@
-import re
 from discord.ext import commands
 import discord
-from db.models import StaffFilter
+from db.cache import filter_cache
 
-from utils.uguild import get_guild_data
+from utils.udm import dm_dispatcher
+from utils.ulog import log_dispatcher
+from utils.umessage import MessageContext
 
 class FilterListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Listener for both DM and server messages.
+    async def process_message(self, context: MessageContext) -> bool:
+        """Filter stage of the message pipeline.
         Args:
-            message (discord.Message): The current message.
+            context (MessageContext): The current message's pipeline context.
+        Returns:
+            bool: Whether the message was filtered (and deleted).
         """
 
-        if message.guild is None:
-            return
-
-        if message.author.bot:
-            return
+        message = context.message
+        guild_data = context.guild_data
         
         # ! Add check for config for NSA Deny List
 
         # Do not trigger if command
 
-        ctx = await self.bot.get_context(message)
-
-        if ctx.valid:
-            return
-
-        guild_data = await get_guild_data(message.guild)
-
-        if message.author.bot:
-            return
+        if context.command:
+            return False
 
         if not guild_data.filtering:
-            return
+            return False
 
-        filtered_messages = [pattern for pattern in await StaffFilter.query.gino.all()]
+        match = context.matches.get("filter")
+        pattern = filter_cache.resolve(match) if match else None
 
-        for pattern in filtered_messages:
-            if not pattern.trigger:
-                return
-            
-            match = re.search(pattern.trigger, message.content, re.IGNORECASE)
-            
-            if match:
-                await log_filtered_message(guild_data.monitor_message_log_id, message, pattern.notify)
+        if not pattern:
+            return False
 
-                await message.delete()
+        # Deleted first, so a failure to log cannot leave the filtered content up
+        await message.delete()
 
-                formatted_filter = "{}**{}**{}".format(message.content[:match.start()], message.content[match.start():match.end()], message.content[match.end():])
+        await log_filtered_message(guild_data.monitor_message_log_id, message, pattern.notify)
 
-                dm_filter_message = "The following message has been flagged and deleted for potentially " \
-                    "breaking the rules on {} (offending phrase bolded):\n\n{}".format(message.guild, formatted_filter) \
-                    + "\n\nIf you believe you haven't broken any rules, or have any other questions or concerns " \
-                    "regarding this, you can contact the staff team for clarification by DMing the ModMail bot, " \
-                    "at the top of the sidebar on the server."
-                
-                dm_filter_message = dm_filter_message if len(dm_filter_message) <= 2000 else dm_filter_message[0:2000]
+        formatted_filter = "{}**{}**{}".format(message.content[:match.start], message.content[match.start:match.end], message.content[match.end:])
 
-                await message.author.send(dm_filter_message)
+        dm_filter_message = "The following message has been flagged and deleted for potentially " \
+            "breaking the rules on {} (offending phrase bolded):\n\n{}".format(message.guild, formatted_filter) \
+            + "\n\nIf you believe you haven't broken any rules, or have any other questions or concerns " \
+            "regarding this, you can contact the staff team for clarification by DMing the ModMail bot, " \
+            "at the top of the sidebar on the server."
+        
+        dm_filter_message = dm_filter_message if len(dm_filter_message) <= 2000 else dm_filter_message[0:2000]
+
+        # Delivered in the background, so the deletion never waits on a DM round trip
+        dm_dispatcher.send(message.author, dm_filter_message)
 
-                return
+        return True
 
 async def log_filtered_message(channel: int, message: discord.Message, notify: bool):
     filter_channel = message.guild.get_channel(channel)
@@ -80,12 +71,9 @@ async def log_filtered_message(channel: int, message: discord.Message, notify: b
 
     embed = discord.Embed(title=author, description=description, color=discord.Colour.magenta())
 
-    embed.set_author(name="Filter was triggered!", icon_url=message.author.avatar_url)
+    embed.set_author(name="Filter was triggered!", icon_url=message.author.display_avatar.url)
 
-    await filter_channel.send(embed=embed)
-    
-    if notify:
-        await filter_channel.send("@here")
+    await log_dispatcher.send(filter_channel, embed, "@here" if notify else None)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(FilterListener(bot))
\ No newline at end of file
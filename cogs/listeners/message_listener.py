@@ -1,17 +1,61 @@
-import re
+from collections import Counter
+import io
 from discord.ext import commands
 import discord
-from db.models import StaffTag
+from db.cache import filter_cache, monitor_cache, tag_cache
 
-from utils.uguild import get_guild_data
+from utils.uguild import get_guild_data, notify_quarantine, truncate
+from utils.ulog import log_dispatcher
+from utils.umatch import regex_guard
+from utils.umessage import MessageContext, MessageStore, build_message_context
+
+# Cogs whose `process_message` stage runs before tags, in order. Every stage runs;
+# one returning True has consumed the message (e.g. deleted it), so no tag replies.
+MESSAGE_STAGES = ("FilterListener", "MonitorListener")
+
+DEFAULT_TAG_COOLDOWN = 30
+DEFAULT_MESSAGE_STORE_MB = 16
+
+class TagCooldowns:
+    """Per-tag, per-channel reply cooldowns with hit counters for tuning.
+
+    Each tag gets a discord.py `CooldownMapping` bucketed by channel, which drops
+    expired buckets on its own, so idle channels cost nothing.
+    """
+
+    def __init__(self, per: float):
+        self.per = per
+        self.mappings: dict[int, commands.CooldownMapping] = {}
+        self.sent = Counter()
+        self.suppressed = Counter()
+
+    def allow(self, tag_id: int, message: discord.Message) -> bool:
+        if self.per <= 0:
+            self.sent[tag_id] += 1
+            return True
+
+        mapping = self.mappings.get(tag_id)
+
+        if mapping is None:
+            mapping = self.mappings[tag_id] = commands.CooldownMapping.from_cooldown(1, self.per, commands.BucketType.channel)
+
+        if mapping.get_bucket(message).update_rate_limit():
+            self.suppressed[tag_id] += 1
+            return False
+
+        self.sent[tag_id] += 1
+        return True
 
 class MessageListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.tag_cooldowns = TagCooldowns(bot.config.get('tag_cooldown', DEFAULT_TAG_COOLDOWN))
+        # Stands in for discord.py's message cache, which the bot runs without
+        self.message_store = MessageStore(int(bot.config.get('message_store_mb', DEFAULT_MESSAGE_STORE_MB) * 1024 * 1024))
     
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        """Listener for both DM and server messages.
+        """Listener for both DM and server messages, dispatching to every message stage.
         Args:
             message (discord.Message): The current message.
         """
@@ -20,68 +64,200 @@ class MessageListener(commands.Cog):
         if message.guild is None:
             return
 
+        self.message_store.add(message)
+
         if message.author.bot:
             return
+
+        context = await build_message_context(self.bot, message)
+        await self.match_patterns(context)
+
+        consumed = False
+
+        for stage in MESSAGE_STAGES:
+            cog = self.bot.get_cog(stage)
+
+            # A filtered message from a monitored user must still reach the monitor logs
+            if cog and await cog.process_message(context):
+                consumed = True
+
+        if not consumed:
+            await self.process_tags(context)
+
+    async def match_patterns(self, context: MessageContext):
+        """Matches the message against every stage's pattern set in one guarded worker call.
+        Args:
+            context (MessageContext): The current message's pipeline context; its `matches` are filled in.
+        """
+
+        guild_data = context.guild_data
+        sets = {}
+
+        # Mirrors the stages' own checks, so sets they would skip are not matched
+        if not context.command and guild_data.filtering:
+            await filter_cache.ensure_loaded()
+            sets["filter"] = filter_cache.get_entries()
+
+        if not context.command and guild_data.monitoring:
+            await monitor_cache.ensure_loaded()
+            sets["monitor"] = monitor_cache.get_entries()
+
+        await tag_cache.ensure_loaded()
+        sets["tag"] = tag_cache.get_entries()
+
+        context.matches, quarantined = await regex_guard.search(sets, context.content)
+
+        if quarantined:
+            await notify_quarantine(context.message.guild, quarantined)
+
+    async def process_tags(self, context: MessageContext):
+        """Tag stage of the message pipeline.
+        Args:
+            context (MessageContext): The current message's pipeline context.
+        """
+
+        message = context.message
         
         # TODO Disable Reply
 
         # TODO Repeat messages
-        # ! Only get non-disabled ones
 
-        tags = [tag for tag in await StaffTag.query.gino.all()]
+        # Only the first matching tag replies, so one message cannot fan out into many sends
+        match = context.matches.get("tag")
+        tag = tag_cache.resolve(match) if match else None
 
-        for tag in tags:
-            if tag.disabled:
-                pass
+        if not tag:
+            return
+
+        # Repeats inside the cooldown fold into the reply already in the channel
+        if not self.tag_cooldowns.allow(tag.tag_id, message):
+            return
 
-            if re.search(tag.trigger, message.content, re.IGNORECASE):
-                try:
-                    await message.channel.send(tag.output)
-                except Exception as e:
-                    await message.channel.send("Oh dear. Something went wrong. Ping a dev with this: {}".format(e))
+        try:
+            await message.channel.send(tag.output)
+        except Exception as e:
+            await message.channel.send("Oh dear. Something went wrong. Ping a dev with this: {}".format(e))
 
     
     @commands.Cog.listener()
-    async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        # TODO Include images/attachments
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        if payload.guild_id is None:
+            return
+
+        content = payload.data.get("content")
 
         # Ignore embeds
-        if not after.content:
+        if not content:
+            return
+
+        stored = self.message_store.get(payload.message_id)
+
+        # Link unfurls fire edits that leave the content unchanged
+        if stored and stored.content == content:
             return
 
-        author = "{} edited in #{}".format(before.author, before.channel)
+        self.message_store.update_content(payload.message_id, content)
 
-        log_channel = before.guild.get_channel(await get_guild_data(before.guild, "logs_id"))
+        guild = self.bot.get_guild(payload.guild_id)
+        log_channel = guild.get_channel(await get_guild_data(guild, "logs_id"))
 
         if not log_channel:
             return
 
+        if "author" in payload.data:
+            author_id = int(payload.data["author"]["id"])
+        elif stored:
+            author_id = stored.author_id
+        else:
+            return
+
+        channel = guild.get_channel_or_thread(payload.channel_id)
+        author = guild.get_member(author_id)
+        jump_url = "https://discord.com/channels/{}/{}/{}".format(payload.guild_id, payload.channel_id, payload.message_id)
+
         embed = discord.Embed(color=discord.Colour.gold())
 
-        embed.set_author(name=author, icon_url=before.author.avatar_url) \
-            .add_field(name="From", value=before.content, inline=False) \
-            .add_field(name="To", value=after.content, inline=False) \
-            .add_field(name="Utilities", value="[21 Jump Street]({})\nUser: {} • ID: {}".format(after.jump_url, before.author.mention, before.author.id), inline=False)
+        embed.set_author(name="{} edited in #{}".format(author or author_id, channel), icon_url=author.display_avatar.url if author else None) \
+            .add_field(name="From", value=truncate(stored.content, 1024) if stored else "*Not available.*", inline=False) \
+            .add_field(name="To", value=truncate(content, 1024), inline=False) \
+            .add_field(name="Utilities", value="[21 Jump Street]({})\nUser: <@{}> • ID: {}".format(jump_url, author_id, author_id), inline=False)
 
-        await log_channel.send(embed=embed)
+        await log_dispatcher.send(log_channel, embed)
 
     @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
-        # TODO Include images/attachments
-        
-        author = "{} deleted in #{}".format(message.author, message.channel)
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.guild_id is None:
+            return
+
+        stored = self.message_store.pop(payload.message_id)
+
+        # Nothing is known about messages older than the store
+        if not stored:
+            return
+
+        guild = self.bot.get_guild(payload.guild_id)
+        log_channel = guild.get_channel(await get_guild_data(guild, "logs_id"))
+
+        if not log_channel:
+            return
 
-        log_channel = message.guild.get_channel(await get_guild_data(message.guild, "logs_id"))
+        channel = guild.get_channel_or_thread(stored.channel_id)
+        author = guild.get_member(stored.author_id)
+
+        embed = discord.Embed(description=stored.content, color=discord.Colour.red())
+
+        embed.set_author(name="{} deleted in #{}".format(author or stored.author_id, channel), icon_url=author.display_avatar.url if author else None)
+
+        if stored.attachments:
+            embed.add_field(name="Attachments", value=truncate("\n".join(stored.attachments), 1024), inline=False)
+
+        embed.add_field(name="Utilities", value="User: <@{}> • ID: {}".format(stored.author_id, stored.author_id), inline=False)
+
+        await log_dispatcher.send(log_channel, embed)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        if payload.guild_id is None:
+            return
+
+        # Resolve everything up front, so the store is cleared even without a log channel
+        message_ids = sorted(payload.message_ids)
+        stored_messages = [self.message_store.pop(message_id) for message_id in message_ids]
+
+        guild = self.bot.get_guild(payload.guild_id)
+        log_channel = guild.get_channel(await get_guild_data(guild, "logs_id"))
 
         if not log_channel:
             return
 
-        embed = discord.Embed(description=message.content, color=discord.Colour.red())
+        channel = guild.get_channel_or_thread(payload.channel_id)
+        lines = []
+
+        for message_id, stored in zip(message_ids, stored_messages):
+            timestamp = discord.utils.snowflake_time(message_id).strftime("%d/%m/%y %H:%M:%S")
+
+            if not stored:
+                lines.append("[{}] (ID: {}) Content not available.".format(timestamp, message_id))
+                continue
+
+            author = guild.get_member(stored.author_id)
+            lines.append("[{}] {} (User ID: {}): {}".format(timestamp, author or "Unknown user", stored.author_id, stored.content))
+
+            for url in stored.attachments:
+                lines.append("    Attachment: {}".format(url))
+
+        known = sum(1 for stored in stored_messages if stored)
+
+        embed = discord.Embed(
+            description="{} messages were bulk deleted in <#{}> ({} with content available).".format(len(message_ids), payload.channel_id, known),
+            color=discord.Colour.red()
+        )
+        embed.set_author(name="Bulk delete in #{}".format(channel))
 
-        embed.set_author(name=author, icon_url=message.author.avatar_url) \
-            .add_field(name="Utilities", value="User: {} • ID: {}".format(message.author.mention, message.author.id), inline=False)
+        log_file = discord.File(io.BytesIO("\n".join(lines).encode("utf-8")), filename="bulk-delete-{}.txt".format(payload.channel_id))
 
-        await log_channel.send(embed=embed)
+        # A single message carries the whole purge, so it bypasses the batching dispatcher
+        await log_channel.send(embed=embed, file=log_file)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(MessageListener(bot))
\ No newline at end of file
@@ -1,58 +1,45 @@
-import re
 from discord.ext import commands
 import discord
-from db.models import StaffMonitorMessage, StaffMonitorUser
+from db.cache import monitor_cache
 
-from utils.uguild import get_guild_data
+from utils.ulog import log_dispatcher
+from utils.umessage import MessageContext
 
 class MonitorListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Listener for both DM and server messages.
+    async def process_message(self, context: MessageContext) -> bool:
+        """Monitor stage of the message pipeline.
         Args:
-            message (discord.Message): The current message.
+            context (MessageContext): The current message's pipeline context.
+        Returns:
+            bool: Whether the message was consumed (monitoring only logs, so never).
         """
 
-        if message.guild is None:
-            return
-
-        if message.author.bot:
-            return
+        message = context.message
+        guild_data = context.guild_data
         
         # ! Add check for config for NSA Deny List
 
         # Do not trigger if command
 
-        ctx = await self.bot.get_context(message)
-
-        if ctx.valid:
-            return
-
-        guild_data = await get_guild_data(message.guild)
-
-        if message.author.bot:
-            return
+        if context.command:
+            return False
 
         if not guild_data.monitoring:
-            return
+            return False
         
-        monitor_users = [user.user_id for user in await StaffMonitorUser.query.gino.all()]
-        monitor_messages = [pattern.message for pattern in await StaffMonitorMessage.query.gino.all()]
+        await monitor_cache.ensure_loaded()
 
-        if message.author.id in monitor_users:
+        if message.author.id in monitor_cache.user_ids:
             await log_suspicious_message(guild_data.monitor_user_log_id, message)
-            return
+            return False
         
-        for pattern in monitor_messages:
-            if not pattern:
-                return
-            
-            if re.search(pattern, message.content, re.IGNORECASE):
-                await log_suspicious_message(guild_data.monitor_message_log_id, message)
-                return
+        if context.matches.get("monitor"):
+            await log_suspicious_message(guild_data.monitor_message_log_id, message)
+
+        return False
 
 async def log_suspicious_message(channel: int, message: discord.Message):
     monitor_channel = message.guild.get_channel(channel)
@@ -64,10 +51,10 @@ async def log_suspicious_message(channel: int, message: discord.Message):
 
     embed = discord.Embed(title=author, description=message.content, color=discord.Colour.red())
 
-    embed.set_author(name="Monitor Trigger", icon_url=message.author.avatar_url) \
+    embed.set_author(name="Monitor Trigger", icon_url=message.author.display_avatar.url) \
         .add_field(name="Utilities", value="[21 Jump Street]({})\nUser: {}  • Channel: <#{}>".format(message.jump_url, message.author.mention, message.channel.id), inline=False)
 
-    await monitor_channel.send(embed=embed)
+    await log_dispatcher.send(monitor_channel, embed)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(MonitorListener(bot))
\ No newline at end of file
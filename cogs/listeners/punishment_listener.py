@@ -1,15 +1,24 @@
+import asyncio
+import logging
 import re
 from typing import Union
 from discord.ext import commands
 import discord
 from db.models import PunishmentType, StaffPunishment, StaffTag
 
-from utils.uguild import get_guild_data
+from utils.uaudit import AuditCheck, audit_correlator
+from utils.uguild import get_guild_data, member_update_stats
+
+logger = logging.getLogger(__name__)
 
 class PunishmentListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
+        audit_correlator.feed(entry)
+
     @commands.Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: Union[discord.User, discord.Member]):
         await query_audit_log(self.bot, guild, user, discord.AuditLogAction.ban, PunishmentType.BAN, False)
@@ -24,14 +33,34 @@ class PunishmentListener(commands.Cog):
     
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
-        mute_role_id = await get_guild_data(before.guild, "mute_id")
+        before_roles = {role.id for role in before.roles}
+        after_roles = {role.id for role in after.roles}
+
+        # Nickname, avatar and timeout changes leave the roles alone, so skip them before any I/O
+        if before_roles == after_roles:
+            member_update_stats["skipped"] += 1
+            return
 
-        if not before.get_role(mute_role_id) and after.get_role(mute_role_id):
-            await query_audit_log(self.bot, before.guild, after, discord.AuditLogAction.member_role_update, PunishmentType.MUTE, False)
-        elif before.get_role(mute_role_id) and not after.get_role(mute_role_id):
-            await query_audit_log(self.bot, before.guild, after, discord.AuditLogAction.member_role_update, PunishmentType.MUTE, True)
+        # Served from the guild data cache after the guild's first lookup
+        mute_role_id = await get_guild_data(before.guild, "mute_id")
 
-async def query_audit_log(bot: commands.Bot, guild: discord.Guild, user: Union[discord.Member, discord.User], action: discord.AuditLogAction, punishment_type: PunishmentType, revocation: bool):
+        if mute_role_id in after_roles - before_roles:
+            member_update_stats["processed"] += 1
+            await query_audit_log(self.bot, before.guild, after, discord.AuditLogAction.member_role_update, PunishmentType.MUTE, False, role_change_check(mute_role_id, False))
+        elif mute_role_id in before_roles - after_roles:
+            member_update_stats["processed"] += 1
+            await query_audit_log(self.bot, before.guild, after, discord.AuditLogAction.member_role_update, PunishmentType.MUTE, True, role_change_check(mute_role_id, True))
+        else:
+            member_update_stats["skipped"] += 1
+
+def role_change_check(role_id: int, removed: bool) -> AuditCheck:
+    def check(entry: discord.AuditLogEntry) -> bool:
+        # Added roles are listed under `after`, removed ones under `before`
+        roles = getattr(entry.before if removed else entry.after, "roles", None) or []
+        return any(role.id == role_id for role in roles)
+    return check
+
+async def query_audit_log(bot: commands.Bot, guild: discord.Guild, user: Union[discord.Member, discord.User], action: discord.AuditLogAction, punishment_type: PunishmentType, revocation: bool, check: AuditCheck = None):
     server_modlog_channel = guild.get_channel(await get_guild_data(guild, "modlog_id"))
     staff_modlog_channel = guild.get_channel(await get_guild_data(guild, "modlog_staff_id"))
 
@@ -40,52 +69,66 @@ async def query_audit_log(bot: commands.Bot, guild: discord.Guild, user: Union[d
     
     # TODO Logger
 
-    async for entry in guild.audit_logs(limit=10, action=action):        
-        if entry.target.id == user.id:
-            staff: discord.User = entry.user
-            reason = entry.reason
-
-            redacted = False
-
-            # Ignore if bot added/removed roles
-            if not revocation and action == discord.AuditLogAction.member_role_update and staff.id == bot.user.id:
-                return
-
-            if not reason and ("-redact" in reason.lower() or "-redacted" in reason.lower()):
-                redacted = True
-                reason = reason.replace("-redact", "").replace("-redacted", "")
-            
-            punishment = StaffPunishment.create(
-                punishment_type = punishment_type,
-                user_display = str(user),
-                user_id = user.id,
-                staff_display = str(staff),
-                staff_id = staff.id,
-                reason = reason,
-                redacted = redacted,
-            )
-
-            if revocation:
-                revocation_log = get_log_revocation(punishment)
-
-                await server_modlog_channel.send(revocation_log)
-
-                if not staff_modlog_channel:
-                    return
-                
-                await staff_modlog_channel.send(revocation_log)
-
-            else:
-                await punishment.create()
-
-                server_modlog = await server_modlog_channel.send(get_log_punishment(punishment, redacted))
-                await punishment.update(message_id=server_modlog.id).apply()
-
-                if not staff_modlog_channel:
-                    return
-                
-                staff_modlog = await staff_modlog_channel.send(get_log_punishment(punishment))
-                await punishment.update(message_staff_id=staff_modlog.id).apply()
+    # Ordinary leaves never get a kick entry, so this just times out without any REST traffic
+    entry = await audit_correlator.wait_for(guild.id, user.id, action, check)
+
+    if not entry:
+        return
+
+    # Ignore if bot added/removed roles
+    if not revocation and action == discord.AuditLogAction.member_role_update and entry.user_id == bot.user.id:
+        return
+
+    staff = entry.user or bot.get_user(entry.user_id) or await bot.fetch_user(entry.user_id)
+    reason = entry.reason
+
+    redacted = False
+
+    if reason and ("-redact" in reason.lower() or "-redacted" in reason.lower()):
+        redacted = True
+        reason = reason.replace("-redacted", "").replace("-redact", "")
+    
+    punishment = StaffPunishment(
+        punishment_type = punishment_type,
+        user_display = str(user),
+        user_id = user.id,
+        staff_display = str(staff),
+        staff_id = staff.id,
+        reason = reason,
+        redacted = redacted,
+        guild_id = guild.id,
+    )
+
+    if revocation:
+        revocation_log = get_log_revocation(punishment)
+        modlog_channels = [channel for channel in (server_modlog_channel, staff_modlog_channel) if channel]
+
+        await asyncio.gather(*(channel.send(revocation_log) for channel in modlog_channels))
+
+    else:
+        punishment = await punishment.create()
+
+        # Both posts only need the case number, so they go out together
+        sends = [server_modlog_channel.send(get_log_punishment(punishment, redacted))]
+
+        if staff_modlog_channel:
+            sends.append(staff_modlog_channel.send(get_log_punishment(punishment)))
+
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        message_ids = [None if isinstance(result, BaseException) else result.id for result in results]
+
+        # Whichever posts went through are recorded in a single write
+        await punishment.update(
+            message_id=message_ids[0],
+            message_staff_id=message_ids[1] if staff_modlog_channel else None
+        ).apply()
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    logger.debug("Logged {} for {} in guild {}, {:.2f}s after its audit entry.".format(
+        punishment_type, user.id, guild.id, (discord.utils.utcnow() - entry.created_at).total_seconds()))
 
 def get_log_punishment(punishment: StaffPunishment, redacted: bool = False):
     modlog = "**Case: #{} | {}**\n**Offender: **{} (User: {}, ID: {})\n**Moderator: **{} (ID: {})\n**Reason: **{}".format(
@@ -1,65 +1,93 @@
+import asyncio
 from discord.ext import commands
 import discord
-
+from cogs.commands.voteladder import update_vote
+from db.cache import active_vote_cache
 from db.models import GuildVote
 
+from utils.uvote import DOWNVOTE, UPVOTE, VoteAggregator, increment_vote
+
 class ReactionListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # Off by default; hot votes can trade count freshness for one write per interval
+        flush_interval = bot.config.get('vote_flush_interval', 0)
+        self.vote_aggregator = VoteAggregator(flush_interval, self.on_vote_update) if flush_interval > 0 else None
+
+    async def cog_load(self):
+        asyncio.create_task(self.warm_votes())
+
+    async def warm_votes(self):
+        # Loaded up front so the first reactions skip the database too, once startup has bound it
+        await self.bot.wait_until_ready()
+        await active_vote_cache.ensure_loaded()
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        self.reaction_checks(payload)
-
-        # Get unicode emoji
-        emoji = payload.emoji.name
+        if not self.reaction_checks(payload):
+            return
 
-        match emoji:
-            # Thumbs Up
-            case "\uD83D\uDC4D":
-                vote_entry = await GuildVote.query.where(GuildVote.message_id == payload.message_id).gino.first()
-                await vote_entry.update(positive = vote_entry.positive + 1).apply()
-            # Thumbs Down
-            case "\uD83D\uDC4E":
-                vote_entry = await GuildVote.query.where(GuildVote.message_id == payload.message_id).gino.first()
-                await vote_entry.update(negative = vote_entry.negative + 1).apply()
+        await self.count_vote(payload, 1)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
-        self.reaction_checks(payload)
+        if not self.reaction_checks(payload):
+            return
+
+        await self.count_vote(payload, -1)
 
+    async def count_vote(self, payload: discord.RawReactionActionEvent, delta: int):
         # Get unicode emoji
         emoji = payload.emoji.name
 
-        match emoji:
-            # Thumbs Up
-            case "\uD83D\uDC4D":
-                vote_entry = await GuildVote.query.where(GuildVote.message_id == payload.message_id).gino.first()
-                await vote_entry.update(positive = vote_entry.positive - 1).apply()
-            # Thumbs Down
-            case "\uD83D\uDC4E":
-                vote_entry = await GuildVote.query.where(GuildVote.message_id == payload.message_id).gino.first()
-                await vote_entry.update(negative = vote_entry.negative - 1).apply()
-    
-    def reaction_checks(self, payload: discord.RawReactionActionEvent):
+        await active_vote_cache.ensure_loaded()
+
+        # Reactions on anything but an open vote never reach the database
+        if payload.message_id not in active_vote_cache:
+            return
+
+        if emoji == UPVOTE:
+            positive, negative = delta, 0
+        elif emoji == DOWNVOTE:
+            positive, negative = 0, delta
+        else:
+            return
+
+        if self.vote_aggregator:
+            self.vote_aggregator.add(payload.message_id, positive, negative)
+            return
+
+        # A single atomic UPDATE, so concurrent reactions cannot overwrite each other
+        vote_entry = await increment_vote(payload.message_id, positive, negative)
+
+        if vote_entry:
+            await self.on_vote_update(vote_entry)
+
+    async def on_vote_update(self, vote_entry: GuildVote):
+        await update_vote(self.bot, vote_entry)
+
+    def reaction_checks(self, payload: discord.RawReactionActionEvent) -> bool:
         # Ignore if self
         if payload.user_id == self.bot.user.id:
-            return
+            return False
 
         # Ignore if not in guild
         if not payload.guild_id:
-            return
-        
+            return False
+
         # Ignore if not unicode emoji
         if not payload.emoji.is_unicode_emoji():
-            return
+            return False
 
-        # Get member object
-        reaction_user = payload.member
+        # Get member object, which removal events do not carry
+        reaction_user = payload.member or self.bot.get_guild(payload.guild_id).get_member(payload.user_id)
 
         # Ignore if bot
-        if reaction_user.bot:
-            return
+        if reaction_user and reaction_user.bot:
+            return False
+
+        return True
 
 async def setup(bot: commands.Bot):
-    await bot.add_cog(ReactionListener(bot))
\ No newline at end of file
+    await bot.add_cog(ReactionListener(bot))
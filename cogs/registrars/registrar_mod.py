@@ -1,17 +1,26 @@
 import asyncio
 from datetime import datetime
+import logging
 from discord.ext import commands
 import discord
 from cogs.commands.voteladder import create_vote
 from cogs.listeners.punishment_listener import get_log_punishment, get_punishment_type_display
-from db.models import GuildVote, GuildVoteLadder, PunishmentType, StaffNote, StaffPunishment
+from db.cache import vote_ladder_cache
+from db.models import GuildVote, PunishmentType, StaffNote, StaffPunishment
 
 from utils.uguild import get_guild_data, mods_or_manage_guild
+from utils.uscheduler import scheduler
 from utils.utime import parse_duration
 
+logger = logging.getLogger(__name__)
+
+# Revocations in flight at once while catching up on expiries
+REVOKE_CONCURRENCY = 5
+
 class RegistrarMod(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.sweep_lock = asyncio.Lock()
         
     # Updates
 
@@ -96,14 +105,15 @@ class RegistrarMod(commands.Cog):
     @commands.command()
     @commands.guild_only()
     async def vote(self, ctx: commands.Context, ladder_name: str, *, vote: str):
-        vote_ladder = await GuildVoteLadder.query.where(GuildVoteLadder.ladder_label == ladder_name.lower()).gino.first()
+        await vote_ladder_cache.ensure_loaded()
+        vote_ladder = vote_ladder_cache.find(ladder_name.lower())
         moderator_role_id = await get_guild_data(ctx.guild, "moderator_id")
 
-        if vote_ladder:
-            await ctx.send("A voteladder with that name already exists.")
+        if not vote_ladder:
+            await ctx.send("That ladder does not exist.")
             return
         
-        if ctx.author.id != moderator_role_id or ctx.author.id != vote_ladder.ladder_role or not ctx.author.guild_permissions.manage_guild:
+        if not (ctx.author.get_role(moderator_role_id) or ctx.author.get_role(vote_ladder.ladder_role) or ctx.author.guild_permissions.manage_guild):
             await ctx.send("You do not have sufficient permissions to execute this command.")
             return
         
@@ -125,16 +135,71 @@ class RegistrarMod(commands.Cog):
             await ctx.send("The case number provided does not exist.")
             return
         
-        if punishment.punishment_type != PunishmentType.BAN or punishment.punishment_type != PunishmentType.MUTE:
+        if punishment.punishment_type not in (PunishmentType.BAN, PunishmentType.MUTE):
             await ctx.send("The case number provided is not a ban or a mute.")
             return
 
         expiry = parse_duration(duration)
 
-        await punishment.update(expiry = expiry).apply()
-        await schedule_expiry(ctx.guild, punishment)
+        await punishment.update(expiry = expiry, expired = False, guild_id = ctx.guild.id).apply()
+        await schedule_expiry(punishment)
         await ctx.send("The expiration has been scheduled to <t:{}>.".format(int(expiry.timestamp())))
 
+    async def cog_load(self):
+        # Jobs only wake the sweeper; the punishment rows say what is due
+        scheduler.register("expiry", lambda jobs: self.sweep_expired())
+        asyncio.create_task(self.startup_sweep())
+
+    async def startup_sweep(self):
+        # Catch up on everything that expired while the bot was down, in one pass
+        await self.bot.wait_until_ready()
+
+        try:
+            await self.sweep_expired()
+        except Exception as e:
+            # Nothing awaits this task; expiry jobs sweep again later
+            logger.warning("Startup expiry sweep failed: {}".format(e))
+
+    async def sweep_expired(self):
+        async with self.sweep_lock:
+            # A single range scan over the expiry index
+            punishments = await StaffPunishment.query \
+                .where((StaffPunishment.expiry <= datetime.utcnow()) & (StaffPunishment.expired == False)) \
+                .gino.all()
+
+            if not punishments:
+                return
+
+            slots = asyncio.Semaphore(REVOKE_CONCURRENCY)
+
+            async def revoke(punishment: StaffPunishment) -> bool:
+                guild = self.bot.get_guild(punishment.guild_id) if punishment.guild_id else None
+
+                if not guild:
+                    logger.warning("Dropping expiry of case {}: its guild is unknown.".format(punishment.punishment_id))
+                    return True
+
+                async with slots:
+                    try:
+                        await revoke_punishment(guild, punishment)
+                    except discord.NotFound:
+                        # Already lifted by hand
+                        pass
+                    except Exception as e:
+                        # Left unmarked, so the next sweep retries it; one bad case must not stop the rest
+                        logger.warning("Failed to revoke case {}: {}".format(punishment.punishment_id, e))
+                        return False
+
+                return True
+
+            results = await asyncio.gather(*(revoke(punishment) for punishment in punishments))
+            done = [punishment.punishment_id for punishment, revoked in zip(punishments, results) if revoked]
+
+            if done:
+                await StaffPunishment.update.values(expired=True).where(StaffPunishment.punishment_id.in_(done)).gino.status()
+
+            logger.info("Revoked {} of {} expired punishments.".format(len(done), len(punishments)))
+
     async def cog_command_error(self, ctx, error: commands.CommandError):
         # ! More robust error checking
         if isinstance(error, commands.ChannelNotFound):
@@ -142,19 +207,21 @@ class RegistrarMod(commands.Cog):
         else:
             await ctx.send(error)
 
-async def schedule_expiry(guild: discord.Guild, punishment: StaffPunishment):
-    await asyncio.sleep(int(punishment.expiry.timestamp()) - int(datetime.utcnow().timestamp()))
-    
+async def schedule_expiry(punishment: StaffPunishment):
+    await scheduler.schedule("expiry", punishment.expiry, {"punishment_id": punishment.punishment_id})
+
+async def revoke_punishment(guild: discord.Guild, punishment: StaffPunishment):
     match punishment.punishment_type:
         case PunishmentType.BAN:
-            await guild.unban(punishment.user_id)
+            await guild.unban(discord.Object(punishment.user_id))
         case PunishmentType.MUTE:
-            user: discord.Member = await guild.get_member(punishment.user_id)
+            user = guild.get_member(punishment.user_id)
+
+            mute_role_id = await get_guild_data(guild, "mute_id")
+
+            # Without a mute role there is no mute left to lift
+            if user and mute_role_id:
+                await user.remove_roles(discord.Object(mute_role_id))
 
-            if user:
-                mute_role_id = await get_guild_data(guild, "mute_id")
-                await user.remove_roles(mute_role_id)
-    
-        
 async def setup(bot: commands.Bot):
     await bot.add_cog(RegistrarMod(bot))
\ No newline at end of file
@@ -6,7 +6,9 @@ from discord.ext import commands
 import discord
 
 from utils.ucommand import reply_unknown_syntax
-from utils.uguild import get_guild_data
+from utils.udm import dm_dispatcher
+from utils.uguild import get_guild_data, guild_data_stats, member_update_stats, truncate
+from utils.ulog import log_dispatcher
 
 class RegistrarSys(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -159,6 +161,38 @@ class RegistrarSys(commands.Cog):
 
         await ctx.send(guild_value_message)
 
+    @commands.command()
+    @commands.is_owner()
+    async def stats(self, ctx: commands.Context):
+        """Shows the bot's process-wide runtime counters, which belong to no one guild."""
+
+        stats_message = "**Runtime Stats**\n**Guild Data Cache:** {} hits, {} misses\n" \
+            "**Member Updates:** {} skipped, {} processed\n" \
+            "**Log Events:** {} received, {} messages sent, {} failed sends\n" \
+            "**DMs:** {} sent, {} skipped, {} closed, {} retried, {} failed" \
+            .format(guild_data_stats["hits"], guild_data_stats["misses"], member_update_stats["skipped"], member_update_stats["processed"],
+                log_dispatcher.stats["events"], log_dispatcher.stats["messages"], log_dispatcher.stats["failures"],
+                dm_dispatcher.stats["sent"], dm_dispatcher.stats["skipped"], dm_dispatcher.stats["closed"], dm_dispatcher.stats["retried"], dm_dispatcher.stats["failed"])
+
+        # The aggregator belongs to the reaction listener, and only exists when vote flushing is on
+        reaction_listener = self.bot.get_cog("ReactionListener")
+        vote_aggregator = reaction_listener.vote_aggregator if reaction_listener else None
+
+        if vote_aggregator:
+            stats_message += "\n**Vote Flushes:** {} reactions, {} writes, {} failures".format(
+                vote_aggregator.stats["reactions"], vote_aggregator.stats["writes"], vote_aggregator.stats["failures"])
+        else:
+            stats_message += "\n**Vote Flushes:** `Off`"
+
+        queue_depths = log_dispatcher.queue_depths()
+
+        if queue_depths:
+            stats_message += "\n**Log Queues:**\n" + "\n".join("<#{}>: {} queued".format(channel_id, depth) for channel_id, depth in sorted(queue_depths.items()))
+        else:
+            stats_message += "\n**Log Queues:** `None`"
+
+        await ctx.send(truncate(stats_message, 2000))
+
     # TODO Eval  
     @commands.command()
     @commands.has_guild_permissions(manage_guild=True)
@@ -0,0 +1,214 @@
+from abc import ABC, abstractmethod
+import asyncio
+
+from db.models import GuildVote, GuildVoteLadder, StaffFilter, StaffMonitorMessage, StaffMonitorUser, StaffTag
+from utils.umatch import PatternMatch
+from utils.usearch import TrigramIndex
+
+class TableCache(ABC):
+    """In-memory mirror of one or more tables, loaded lazily on first use.
+
+    Subclasses implement `load`; the commands that write the tables
+    keep the mirror in sync, so readers on the message path never touch the database.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_loaded(self):
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if self.loaded:
+                return
+
+            await self.load()
+            self.loaded = True
+
+    @abstractmethod
+    async def load(self):
+        pass
+
+class CachedFilter:
+    def __init__(self, filter_id: int, trigger: str, notify: bool):
+        self.filter_id = filter_id
+        self.trigger = trigger
+        self.notify = notify
+
+class FilterCache(TableCache):
+    """Mirror of the `StaffFilter` table, matched as a single `PatternSet` in `regex_guard`'s workers."""
+
+    def __init__(self):
+        super().__init__()
+        self.filters: dict[int, CachedFilter] = {}
+        self.entries: tuple[tuple[tuple[str, int], str], ...] | None = None
+
+    async def load(self):
+        for row in await StaffFilter.query.order_by(StaffFilter.filter_id).gino.all():
+            self.add(row)
+
+    def add(self, row: StaffFilter):
+        if not row.trigger:
+            return
+
+        self.filters[row.filter_id] = CachedFilter(row.filter_id, row.trigger, row.notify)
+        self.entries = None
+
+    def update(self, row: StaffFilter):
+        self.add(row)
+
+    def remove(self, filter_id: int):
+        self.filters.pop(filter_id, None)
+        self.entries = None
+
+    def get_entries(self) -> tuple[tuple[tuple[str, int], str], ...]:
+        # Rebuilt lazily; the workers compile each distinct set once, so a burst of command edits costs one compile
+        if self.entries is None:
+            self.entries = tuple((("filter", filter_id), cached_filter.trigger) for filter_id, cached_filter in self.filters.items())
+
+        return self.entries
+
+    def resolve(self, match: PatternMatch) -> CachedFilter | None:
+        return self.filters.get(match.key[1])
+
+class MonitorCache(TableCache):
+    """Mirror of the `StaffMonitorUser` and `StaffMonitorMessage` tables."""
+
+    def __init__(self):
+        super().__init__()
+        self.user_ids: set[int] = set()
+        self.messages: dict[int, str] = {}
+        self.entries: tuple[tuple[tuple[str, int], str], ...] | None = None
+
+    async def load(self):
+        for row in await StaffMonitorUser.query.gino.all():
+            self.add_user(row.user_id)
+
+        for row in await StaffMonitorMessage.query.order_by(StaffMonitorMessage.monitor_message_id).gino.all():
+            self.add_message(row)
+
+    def add_user(self, user_id: int):
+        self.user_ids.add(user_id)
+
+    def remove_user(self, user_id: int):
+        self.user_ids.discard(user_id)
+
+    def add_message(self, row: StaffMonitorMessage):
+        if not row.message:
+            return
+
+        self.messages[row.monitor_message_id] = row.message
+        self.entries = None
+
+    def remove_message(self, monitor_message_id: int):
+        self.messages.pop(monitor_message_id, None)
+        self.entries = None
+
+    def get_entries(self) -> tuple[tuple[tuple[str, int], str], ...]:
+        if self.entries is None:
+            self.entries = tuple((("monitor", monitor_message_id), message) for monitor_message_id, message in self.messages.items())
+
+        return self.entries
+
+class CachedTag:
+    def __init__(self, tag_id: int, trigger: str, output: str, disabled: bool):
+        self.tag_id = tag_id
+        self.trigger = trigger
+        self.output = output
+        self.disabled = disabled
+
+class TagCache(TableCache):
+    """Mirror of the `StaffTag` table; only enabled tags are put in the trigger entries.
+
+    Every tag's trigger is also kept in a trigram index for `tag find`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tags: dict[int, CachedTag] = {}
+        self.entries: tuple[tuple[tuple[str, int], str], ...] | None = None
+        self.search_index = TrigramIndex()
+
+    async def load(self):
+        for row in await StaffTag.query.order_by(StaffTag.tag_id).gino.all():
+            self.add(row)
+
+    def add(self, row: StaffTag):
+        self.tags[row.tag_id] = CachedTag(row.tag_id, row.trigger, row.output, bool(row.disabled))
+        self.entries = None
+        self.search_index.add(row.tag_id, str(row.trigger))
+
+    def update(self, row: StaffTag):
+        self.add(row)
+
+    def remove(self, tag_id: int):
+        self.tags.pop(tag_id, None)
+        self.entries = None
+        self.search_index.remove(tag_id)
+
+    def find(self, query: str, limit: int = 100) -> list[CachedTag]:
+        return [self.tags[tag_id] for tag_id in self.search_index.search(query, limit)]
+
+    def get_entries(self) -> tuple[tuple[tuple[str, int], str], ...]:
+        if self.entries is None:
+            self.entries = tuple((("tag", tag_id), tag.trigger) for tag_id, tag in self.tags.items() if not tag.disabled)
+
+        return self.entries
+
+    def resolve(self, match: PatternMatch) -> CachedTag | None:
+        return self.tags.get(match.key[1])
+
+class ActiveVoteCache(TableCache):
+    """Message IDs of open `GuildVote`s, so reactions elsewhere are rejected without a query."""
+
+    def __init__(self):
+        super().__init__()
+        self.votes: dict[int, int] = {}
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self.votes
+
+    async def load(self):
+        for row in await GuildVote.query.where((GuildVote.finished == False) & (GuildVote.message_id != None)).gino.all():
+            self.add(row)
+
+    def add(self, row: GuildVote):
+        self.votes[row.message_id] = row.vote_id
+
+    def remove(self, message_id: int):
+        self.votes.pop(message_id, None)
+
+class VoteLadderCache(TableCache):
+    """Mirror of the `GuildVoteLadder` table.
+
+    Holds the model instances themselves, so commands that change a ladder
+    through `update(...).apply()` update the cached settings with the row.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ladders: dict[int, GuildVoteLadder] = {}
+
+    async def load(self):
+        for row in await GuildVoteLadder.query.gino.all():
+            self.add(row)
+
+    def add(self, row: GuildVoteLadder):
+        self.ladders[row.ladder_id] = row
+
+    def remove(self, ladder_id: int):
+        self.ladders.pop(ladder_id, None)
+
+    def get(self, ladder_id: int) -> GuildVoteLadder | None:
+        return self.ladders.get(ladder_id)
+
+    def find(self, ladder_label: str) -> GuildVoteLadder | None:
+        return next((ladder for ladder in self.ladders.values() if ladder.ladder_label == ladder_label), None)
+
+filter_cache = FilterCache()
+monitor_cache = MonitorCache()
+tag_cache = TagCache()
+active_vote_cache = ActiveVoteCache()
+vote_ladder_cache = VoteLadderCache()
@@ -0,0 +1,104 @@
+"""Versioned schema migrations, applied by `db_main` on startup.
+
+The applied version is kept in `public.schema_version`, so a current
+database costs two cheap queries and no DDL. Changes to the models need a
+new migration appended to `MIGRATIONS`; `create_all` only runs once, in the
+baseline, and never alters existing tables.
+"""
+
+import logging
+import time
+
+from db.models import db, schemas_list
+
+logger = logging.getLogger(__name__)
+
+async def baseline():
+    for schema_name in schemas_list:
+        await db.status(db.text(f"CREATE SCHEMA IF NOT EXISTS {schema_name}"))
+
+    # Creates missing tables only; columns added to existing tables since are migrated below
+    await db.gino.create_all()
+
+async def expiry_columns():
+    await db.status(db.text("ALTER TABLE staff.punishment ADD COLUMN IF NOT EXISTS expired BOOLEAN DEFAULT false"))
+    await db.status(db.text("ALTER TABLE staff.punishment ADD COLUMN IF NOT EXISTS guild_id BIGINT"))
+
+    # Punishments from before the column have no guild, and the sweep would drop their
+    # expiry. The bot serves a single guild in practice, so that guild is theirs.
+    await db.status(db.text(
+        "UPDATE staff.punishment SET guild_id = (SELECT min(guild_id) FROM guild.guild_data) "
+        "WHERE guild_id IS NULL AND (SELECT count(*) FROM guild.guild_data) = 1"
+    ))
+
+async def lookup_indexes():
+    # Named as SQLAlchemy names `index=True` columns, so fresh and upgraded databases match
+    await create_index_concurrently("guild", "vote", "ix_guild_vote_message_id", "message_id")
+    await create_index_concurrently("member", "reminder", "ix_member_reminder_time", "time")
+    await create_index_concurrently("staff", "punishment", "ix_staff_punishment_expiry", "expiry")
+
+async def reminder_jobs():
+    # Reminders set before the scheduler existed have no job to fire them
+    await db.status(db.text(
+        "INSERT INTO guild.scheduled_job (kind, due, payload) "
+        "SELECT 'reminder', reminder.time, json_build_object('reminder_id', reminder.reminder_id) "
+        "FROM member.reminder AS reminder "
+        "WHERE reminder.time > now() AT TIME ZONE 'utc' AND NOT EXISTS ("
+        "SELECT 1 FROM guild.scheduled_job AS job "
+        "WHERE job.kind = 'reminder' AND (job.payload->>'reminder_id')::integer = reminder.reminder_id)"
+    ))
+
+async def job_attempts():
+    await db.status(db.text("ALTER TABLE guild.scheduled_job ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0"))
+
+# (version, description, migration). None run in a transaction, which CREATE INDEX CONCURRENTLY forbids.
+MIGRATIONS = [
+    (1, "schemas and tables", baseline),
+    (2, "punishment expiry columns", expiry_columns),
+    (3, "lookup indexes", lookup_indexes),
+    (4, "jobs for pending reminders", reminder_jobs),
+    (5, "scheduled job attempts", job_attempts),
+]
+
+async def create_index_concurrently(schema: str, table: str, name: str, column: str):
+    """Builds an index without blocking writes to the table.
+
+    A failed concurrent build leaves an invalid index behind, which
+    `IF NOT EXISTS` would otherwise accept, so it is dropped and rebuilt.
+    """
+
+    valid = await db.scalar(db.text(
+        "SELECT i.indisvalid FROM pg_index AS i "
+        "JOIN pg_class AS c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace AS n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = :schema AND c.relname = :name"
+    ), schema=schema, name=name)
+
+    if valid is False:
+        await db.status(db.text(f"DROP INDEX CONCURRENTLY IF EXISTS {schema}.{name}"))
+
+    await db.status(db.text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {schema}.{table} ({column})"))
+
+async def get_schema_version() -> int:
+    if not await db.scalar(db.text("SELECT to_regclass('public.schema_version') IS NOT NULL")):
+        await db.status(db.text("CREATE TABLE public.schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'))"))
+        return 0
+
+    return await db.scalar(db.text("SELECT coalesce(max(version), 0) FROM public.schema_version"))
+
+async def migrate():
+    version = await get_schema_version()
+    pending = [migration for migration in MIGRATIONS if migration[0] > version]
+
+    if not pending:
+        logger.info("Database schema is current (version {}).".format(version))
+        return
+
+    for version, description, migration in pending:
+        start = time.perf_counter()
+
+        # Each migration is idempotent, so one interrupted before its version is recorded simply reruns
+        await migration()
+        await db.status(db.text("INSERT INTO public.schema_version (version, description) VALUES (:version, :description)"), version=version, description=description)
+
+        logger.info("Applied migration {} ({}) in {:.2f}s.".format(version, description, time.perf_counter() - start))
@@ -87,7 +87,7 @@ class GuildVote(db.Model):
     __table_args__ = {"schema": "guild"}
 
     vote_id = db.Column(db.Integer(), primary_key=True, autoincrement=True)
-    message_id = db.Column(db.BigInteger())
+    message_id = db.Column(db.BigInteger(), index=True)
     message = db.Column(db.Text())
     positive = db.Column(db.Integer(), unique=False, default=0)
     negative = db.Column(db.Integer(), unique=False, default=0)
@@ -95,6 +95,16 @@ class GuildVote(db.Model):
     finished = db.Column(db.Boolean(), default = False)
     ladder_id = db.Column(db.Integer(), db.ForeignKey(GuildVoteLadder.ladder_id))
 
+class GuildScheduledJob(db.Model):
+    __tablename__ = "scheduled_job"
+    __table_args__ = {"schema": "guild"}
+
+    job_id = db.Column(db.Integer(), primary_key=True, autoincrement=True)
+    kind = db.Column(db.Text())
+    due = db.Column(db.DateTime(), index=True)
+    payload = db.Column(db.JSON())
+    attempts = db.Column(db.Integer(), default=0, server_default="0")
+
 # Staff Tables
 
 class StaffTag(db.Model):
@@ -182,7 +192,9 @@ class StaffPunishment(db.Model):
     redacted = db.Column(db.Boolean())
     message_id = db.Column(db.BigInteger())
     message_staff_id = db.Column(db.BigInteger())
-    expiry = db.Column(db.DateTime())
+    expiry = db.Column(db.DateTime(), index=True)
+    expired = db.Column(db.Boolean(), default=False)
+    guild_id = db.Column(db.BigInteger())
 
 # Helper Tables
 
@@ -233,19 +245,17 @@ class MemberReminder(db.Model):
 
     reminder_id = db.Column(db.Integer(), primary_key=True, autoincrement=True)
     text = db.Column(db.Text())
-    time = db.Column(db.DateTime())
+    time = db.Column(db.DateTime(), index=True)
     user_id = db.Column(db.BigInteger())
 
 async def db_main():
     """
-    Create the tables and columns if they don't already exist,
+    Bind the database and bring its schema up to the latest migration.
     """
 
+    # Imported here, as the migrations need the models defined above
+    from db.migrations import migrate
+
     await db.set_bind('postgresql+asyncpg://{}:{}@{}:5432/{}'.format(config['db_user'], config['db_password'], config['db_host'], config['db_database']))
 
-    # Creates the schemas
-    for schema_name in schemas_list:
-        sql = f"CREATE SCHEMA IF NOT EXISTS {schema_name}"
-        await db.status(db.text(sql))
-    
-    await db.gino.create_all()
\ No newline at end of file
+    await migrate()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+from collections import deque
+from typing import Callable
+
+import discord
+
+# Seconds an audit entry nobody has asked for yet is kept, in case its gateway event is late
+ENTRY_TTL = 30.0
+# Seconds a moderation event waits for its audit entry before it is treated as unattributed
+WAIT_TIMEOUT = 5.0
+
+AuditKey = tuple[int, int, discord.AuditLogAction]
+AuditCheck = Callable[[discord.AuditLogEntry], bool]
+
+class AuditLogCorrelator:
+    """Pairs moderation events with the audit entries pushed by `on_audit_log_entry_create`.
+
+    The gateway event (ban, kick, role change) and its audit entry arrive in
+    either order. Whichever comes first parks under (guild, target, action):
+    entries for a short TTL, events as a waiting future. No audit log is
+    ever fetched over REST, so a raid's worth of bans costs nothing extra.
+    """
+
+    def __init__(self, ttl: float = ENTRY_TTL):
+        self.ttl = ttl
+        self.entries: dict[AuditKey, deque[tuple[float, discord.AuditLogEntry]]] = {}
+        self.waiters: dict[AuditKey, list[tuple[asyncio.Future, AuditCheck | None]]] = {}
+
+    def feed(self, entry: discord.AuditLogEntry):
+        target_id = getattr(entry.target, "id", None)
+
+        if target_id is None:
+            return
+
+        key = (entry.guild.id, target_id, entry.action)
+
+        for waiter in self.waiters.get(key, ()):
+            future, check = waiter
+
+            if not future.done() and (check is None or check(entry)):
+                future.set_result(entry)
+                self.waiters[key].remove(waiter)
+                return
+
+        loop = asyncio.get_running_loop()
+        self.prune(loop.time())
+        self.entries.setdefault(key, deque()).append((loop.time() + self.ttl, entry))
+
+    async def wait_for(self, guild_id: int, target_id: int, action: discord.AuditLogAction, check: AuditCheck | None = None, timeout: float = WAIT_TIMEOUT) -> discord.AuditLogEntry | None:
+        """Returns the audit entry for the event, or None if none arrives within the timeout."""
+
+        key = (guild_id, target_id, action)
+        loop = asyncio.get_running_loop()
+        self.prune(loop.time())
+
+        queued = self.entries.get(key)
+
+        if queued:
+            for item in queued:
+                if check is None or check(item[1]):
+                    queued.remove(item)
+
+                    if not queued:
+                        del self.entries[key]
+
+                    return item[1]
+
+        future = loop.create_future()
+        waiter = (future, check)
+        self.waiters.setdefault(key, []).append(waiter)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self.waiters.get(key)
+
+            if waiters is not None:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+
+                if not waiters:
+                    del self.waiters[key]
+
+    def prune(self, now: float):
+        for key in [key for key, queued in self.entries.items() if queued[-1][0] <= now]:
+            del self.entries[key]
+
+        for queued in self.entries.values():
+            while queued[0][0] <= now:
+                queued.popleft()
+
+audit_correlator = AuditLogCorrelator()
@@ -0,0 +1,111 @@
+import asyncio
+from collections import Counter, OrderedDict
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# DMs in flight at once, so a raid's worth of filter notices cannot exhaust the rate limits
+MAX_CONCURRENT = 5
+# DM channels remembered, least recently used first out
+CHANNEL_CACHE = 1024
+# Seconds a user whose DMs are closed is skipped before trying again
+CLOSED_TTL = 3600
+# Attempts for a DM failing on a server or network error, with exponential backoff between them
+ATTEMPTS = 3
+BACKOFF = 1.0
+
+class DMDispatcher:
+    """Delivers DMs in the background, off the message and timer paths.
+
+    `send` returns immediately. Delivery runs under a concurrency limit,
+    reuses each user's DM channel, and skips users whose DMs were found
+    closed within the last `CLOSED_TTL` seconds. Transient failures are
+    retried with backoff.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, closed_ttl: float = CLOSED_TTL):
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.closed_ttl = closed_ttl
+        self.channels: OrderedDict[int, discord.DMChannel] = OrderedDict()
+        self.closed: dict[int, float] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.stats = Counter(sent=0, skipped=0, closed=0, retried=0, failed=0)
+
+    def send(self, user: discord.abc.User, content: str):
+        """Queues a DM to the user without waiting for it to be delivered."""
+
+        task = asyncio.create_task(self._deliver(user, content))
+
+        # Keep a reference until done, or the task can be collected mid-flight
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def dms_closed(self, user_id: int) -> bool:
+        closed_until = self.closed.get(user_id)
+
+        if closed_until is None:
+            return False
+
+        if closed_until <= asyncio.get_running_loop().time():
+            del self.closed[user_id]
+            return False
+
+        return True
+
+    def mark_closed(self, user_id: int):
+        now = asyncio.get_running_loop().time()
+
+        # Expired flags are otherwise only dropped when their user is messaged again
+        if len(self.closed) >= CHANNEL_CACHE:
+            self.closed = {closed_id: closed_until for closed_id, closed_until in self.closed.items() if closed_until > now}
+
+        self.closed[user_id] = now + self.closed_ttl
+
+    async def _deliver(self, user: discord.abc.User, content: str):
+        if self.dms_closed(user.id):
+            self.stats["skipped"] += 1
+            return
+
+        async with self.slots:
+            for attempt in range(ATTEMPTS):
+                try:
+                    channel = await self._get_channel(user)
+                    await channel.send(content)
+                    self.stats["sent"] += 1
+                    return
+                except discord.Forbidden:
+                    # DMs closed, or no mutual guild left; retrying cannot help
+                    self.stats["closed"] += 1
+                    self.mark_closed(user.id)
+                    return
+                except (discord.DiscordServerError, OSError) as e:
+                    if attempt + 1 == ATTEMPTS:
+                        error = e
+                        break
+
+                    self.stats["retried"] += 1
+                    await asyncio.sleep(BACKOFF * 2 ** attempt)
+                except discord.HTTPException as e:
+                    error = e
+                    break
+
+        self.stats["failed"] += 1
+        logger.warning("Failed to DM user {}: {}".format(user.id, error))
+
+    async def _get_channel(self, user: discord.abc.User) -> discord.DMChannel:
+        channel = self.channels.get(user.id)
+
+        if channel is None:
+            channel = user.dm_channel or await user.create_dm()
+            self.channels[user.id] = channel
+
+            if len(self.channels) > CHANNEL_CACHE:
+                self.channels.popitem(last=False)
+        else:
+            self.channels.move_to_end(user.id)
+
+        return channel
+
+dm_dispatcher = DMDispatcher()
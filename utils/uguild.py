@@ -1,13 +1,37 @@
+from collections import Counter
 import discord
 from discord.ext import commands
+from sqlalchemy.dialects.postgresql import insert
 from db.models import GuildData
 import re
 
+from utils.umatch import analyze_regex
+
+# One GuildData instance per guild. Commands update it through `guild_data.update(...).apply()`,
+# which writes the row and the cached instance together, so the cache never goes stale.
+guild_data_cache: dict[int, GuildData] = {}
+guild_data_stats = Counter(hits=0, misses=0)
+# Kept here rather than in the listener, as loading an extension executes a fresh copy of its module
+member_update_stats = Counter(skipped=0, processed=0)
+
 async def get_guild_data(guild: discord.Guild, prop: str = None) -> GuildData:
-    guild_data = await GuildData.query.where(GuildData.guild_id == guild.id).gino.first()
+    guild_data = guild_data_cache.get(guild.id)
 
     if guild_data is None:
-        guild_data = await GuildData.create(guild_id=guild.id)
+        guild_data_stats["misses"] += 1
+
+        # The no-op update makes Postgres return the existing row on conflict, so
+        # concurrent first events for a guild cannot race a select-then-insert.
+        guild_data = await insert(GuildData.__table__) \
+            .values(guild_id=guild.id) \
+            .on_conflict_do_update(index_elements=[GuildData.guild_id], set_={"guild_id": guild.id}) \
+            .returning(*GuildData.__table__.columns) \
+            .gino.model(GuildData).first()
+
+        # Concurrent misses converge on whichever instance was cached first
+        guild_data = guild_data_cache.setdefault(guild.id, guild_data)
+    else:
+        guild_data_stats["hits"] += 1
     
     return getattr(guild_data, prop) if prop else guild_data
 
@@ -17,6 +41,16 @@ def mods_or_manage_guild():
         return commands.check_any(commands.has_guild_permissions(manage_guild=True), commands.has_role(moderator_role_id))
     return commands.check(predicate)
 
+async def notify_quarantine(guild: discord.Guild, quarantined: list):
+    staff_channel = guild.get_channel(await get_guild_data(guild, "modlog_staff_id"))
+
+    if not staff_channel:
+        return
+
+    for (kind, _), pattern in quarantined:
+        await staff_channel.send(truncate("The {} pattern (`{}`) kept exceeding its matching time budget and has been quarantined. " \
+            "Please review or remove it.".format(kind, pattern), 2000))
+
 def truncate(input: str, length: int):
     if len(input) <= length:
         return input
@@ -24,10 +58,22 @@ def truncate(input: str, length: int):
     cut_down = len(symbol) + 1
     return input[0:length - cut_down] + symbol
 
-def assert_regex(pattern: str):
+async def assert_regex(pattern: str) -> str | None:
+    """Rejects invalid or too expensive patterns, returning a warning for risky ones."""
+
     try: re.compile(pattern)
     except re.error: raise RuntimeError("The regex pattern provided is invalid.")
 
+    report = await analyze_regex(pattern)
+
+    if report.rejected:
+        raise RuntimeError("The regex pattern provided is too expensive to run on every message: {}.".format(report.describe()))
+
+    if report.flagged:
+        return "Warning: the regex pattern provided may be slow: {}.".format(report.describe())
+
+    return None
+
 def assert_length(value: str, length: int, error: str):
     if len(value) > length:
         raise RuntimeError(error)
@@ -0,0 +1,104 @@
+import asyncio
+from collections import Counter
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Discord allows at most 10 embeds, and 6000 embed characters, per message
+BATCH_EMBEDS = 10
+BATCH_CHARACTERS = 6000
+BATCH_CONTENT = 2000
+# Seconds the first queued event waits for company before its batch is sent
+FLUSH_INTERVAL = 1.0
+# Events queued per channel before `send` starts waiting (backpressure)
+MAX_QUEUE = 500
+
+class LogEvent:
+    def __init__(self, embed: discord.Embed | None, content: str | None):
+        self.embed = embed
+        self.content = content
+
+class LogDispatcher:
+    """Packs log events bound for the same channel into multi-embed messages.
+
+    Each channel gets a queue and a worker. The worker sends a batch once it is
+    full or `FLUSH_INTERVAL` seconds after its first event, so a raid or purge
+    costs one REST call per ten events instead of one per event.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_queue: int = MAX_QUEUE):
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queues: dict[int, asyncio.Queue] = {}
+        self.workers: dict[int, asyncio.Task] = {}
+        self.stats = Counter(events=0, messages=0, failures=0)
+
+    async def send(self, channel: discord.abc.Messageable, embed: discord.Embed | None = None, content: str | None = None):
+        """Queues an event for the channel, waiting while its queue is full."""
+
+        queue = self.queues.get(channel.id)
+
+        if queue is None:
+            queue = self.queues[channel.id] = asyncio.Queue(self.max_queue)
+            self.workers[channel.id] = asyncio.create_task(self._worker(channel, queue))
+
+        if queue.full():
+            logger.warning("Log queue for channel {} is full ({} events), applying backpressure.".format(channel.id, queue.qsize()))
+
+        self.stats["events"] += 1
+        await queue.put(LogEvent(embed, content))
+
+    def queue_depths(self) -> dict[int, int]:
+        return {channel_id: queue.qsize() for channel_id, queue in self.queues.items()}
+
+    async def _worker(self, channel: discord.abc.Messageable, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        carry: LogEvent | None = None
+
+        while True:
+            batch = [carry or await queue.get()]
+            carry = None
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < BATCH_EMBEDS:
+                try:
+                    event = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+
+                    if remaining <= 0:
+                        break
+
+                    try:
+                        event = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                if not fits(batch, event):
+                    carry = event
+                    break
+
+                batch.append(event)
+
+            await self._flush(channel, batch)
+
+    async def _flush(self, channel: discord.abc.Messageable, batch: list[LogEvent]):
+        embeds = [event.embed for event in batch if event.embed]
+        content = "\n".join(event.content for event in batch if event.content) or None
+
+        try:
+            await channel.send(content=content, embeds=embeds)
+            self.stats["messages"] += 1
+        except discord.HTTPException as e:
+            self.stats["failures"] += 1
+            logger.warning("Failed to send {} log event(s) to channel {}: {}".format(len(batch), channel.id, e))
+
+def fits(batch: list[LogEvent], event: LogEvent) -> bool:
+    characters = sum(len(item.embed) for item in batch if item.embed) + (len(event.embed) if event.embed else 0)
+    content = sum(len(item.content) + 1 for item in batch if item.content) + (len(event.content) if event.content else 0)
+
+    return characters <= BATCH_CHARACTERS and content <= BATCH_CONTENT
+
+log_dispatcher = LogDispatcher()
@@ -0,0 +1,865 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, OrderedDict
+import contextlib
+import multiprocessing
+import os
+import re
+from re import _constants, _parser
+import signal
+import time
+from typing import Hashable, Iterable, Iterator
+
+# Patterns relying on their own group numbering/names or on global inline flags
+# cannot be folded into the combined alternation, so they are matched on their own.
+UNCOMBINABLE_PATTERN = re.compile(r"\\[1-9]|\\g<|\(\?P[<=]|\(\?<(?![=!])|\(\?\(|^\(\?[aiLmsux]+\)")
+
+# Longer literals do not make the prefilter more selective, only the trie deeper.
+MAX_LITERAL_LENGTH = 32
+
+# Seconds a single match may run before its worker is killed
+MATCH_BUDGET = 0.1
+# Budget overruns after which a pattern is quarantined
+QUARANTINE_STRIKES = 3
+MATCH_WORKERS = 2
+
+# Worst-case seconds per match at which a new pattern is rejected, as it would overrun
+# the match budget anyway, and above which it is only flagged
+REJECT_COST = MATCH_BUDGET
+WARN_COST = 0.01
+# Seconds the creation-time benchmark may run before the pattern is rejected outright
+ANALYSIS_BUDGET = 2.0
+# Adversarial inputs are sized like the longest message a member can send
+ADVERSARIAL_LENGTH = 2000
+
+class PatternMatch:
+    def __init__(self, key: Hashable, start: int, end: int):
+        self.key = key
+        self.start = start
+        self.end = end
+
+    @property
+    def span(self) -> tuple[int, int]:
+        return self.start, self.end
+
+class PatternSet:
+    """Matches a message against many rules without running every rule.
+
+    Each rule's required literal (a substring any match must contain) is folded
+    into one trie-shaped regex, so a single scan of the casefolded content yields
+    the few candidate rules worth confirming with their full pattern. Rules with
+    no usable literal are joined into one alternation of named groups instead.
+
+    Args:
+        entries (Iterable[tuple[Hashable, str]]): (rule key, pattern) pairs, in priority order.
+        flags (int): Flags applied to every pattern.
+    """
+
+    def __init__(self, entries: Iterable[tuple[Hashable, str]], flags: int = re.IGNORECASE):
+        self.entries = tuple((key, pattern) for key, pattern in entries if pattern)
+        self.flags = flags
+        self.compiled: dict[int, re.Pattern] = {}
+        self.literals: dict[str, list[int]] = {}
+        self.prefilter: re.Pattern | None = None
+        self.combined: re.Pattern | None = None
+        self.group_indices: dict[int, int] = {}
+        self.combinable: list[int] = []
+        self.standalone: list[int] = []
+
+        combinable = []
+
+        for index, (_, pattern) in enumerate(self.entries):
+            try:
+                compiled = re.compile(pattern, flags)
+            except re.error:
+                continue
+
+            self.compiled[index] = compiled
+            literal = required_literal(pattern, flags)
+
+            if literal:
+                self.literals.setdefault(literal, []).append(index)
+            elif compiled.groupindex or UNCOMBINABLE_PATTERN.search(pattern):
+                self.standalone.append(index)
+            else:
+                combinable.append(index)
+
+        if self.literals:
+            self.prefilter = re.compile(trie_regex(self.literals))
+
+        if not combinable:
+            return
+
+        alternation = "|".join("(?P<_{}>{})".format(index, self.entries[index][1]) for index in combinable)
+
+        try:
+            self.combined = re.compile(alternation, flags)
+        except (re.error, OverflowError, RecursionError):
+            self.standalone = sorted(combinable + self.standalone)
+            return
+
+        self.combinable = combinable
+
+        for name, group in self.combined.groupindex.items():
+            self.group_indices[group] = int(name[1:])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def candidates(self, content: str) -> list[int]:
+        """Returns the prefiltered rules whose literal occurs in the content, in priority order."""
+
+        if not self.prefilter:
+            return []
+
+        # Under IGNORECASE an ASCII "i" also matches "\u0130" and "\u0131", which casefold differently
+        folded = content.casefold().replace("\u0131", "i").replace("\u0307", "")
+        found = set()
+        position = 0
+
+        # Literals may overlap, so restart one character after each hit. The trie
+        # is greedy, so shorter literals found at the same spot are its prefixes.
+        while match := self.prefilter.search(folded, position):
+            literal = match.group()
+
+            for length in range(1, len(literal) + 1):
+                found.update(self.literals.get(literal[:length], ()))
+
+            position = match.start() + 1
+
+        return sorted(found)
+
+    def runnable(self, content: str) -> list[int]:
+        """Returns every rule a search or scan of the content runs, in priority order."""
+        return sorted(self.candidates(content) + self.combinable + self.standalone)
+
+    def search(self, content: str) -> PatternMatch | None:
+        """Returns a matching rule, preferring earlier entries, if any."""
+
+        best: tuple[int, re.Match] | None = None
+
+        for index in self.candidates(content):
+            match = self.compiled[index].search(content)
+
+            if match:
+                best = (index, match)
+                break
+
+        if self.combined:
+            match = self.combined.search(content)
+
+            if match:
+                index = self.group_indices[match.lastindex]
+
+                # The alternation returns the leftmost match, which need not be the
+                # earliest rule, so the rules before it are confirmed one by one
+                for earlier in self.combinable:
+                    if earlier >= index or (best and earlier > best[0]):
+                        break
+
+                    earlier_match = self.compiled[earlier].search(content)
+
+                    if earlier_match:
+                        index, match = earlier, earlier_match
+                        break
+
+                if not best or index < best[0]:
+                    best = (index, match)
+
+        for index in self.standalone:
+            if best and index > best[0]:
+                break
+
+            match = self.compiled[index].search(content)
+
+            if match:
+                best = (index, match)
+                break
+
+        if not best:
+            return None
+
+        index, match = best
+        return PatternMatch(self.entries[index][0], *match.span())
+
+    def matches(self, content: str) -> Iterator[PatternMatch]:
+        """Yields each matching rule once, in priority order, with the span of its first match.
+
+        The combined alternation only gates the rules without a literal: its scan
+        skips overlapping matches, so each of those rules is confirmed on its own.
+        """
+
+        indices = self.candidates(content) + self.standalone
+
+        if self.combined and self.combined.search(content):
+            indices += self.combinable
+
+        for index in sorted(indices):
+            match = self.compiled[index].search(content)
+
+            if match:
+                yield PatternMatch(self.entries[index][0], *match.span())
+
+def required_literal(pattern: str, flags: int = 0) -> str:
+    """Returns the longest casefolded literal every match of the pattern must contain.
+
+    Only ASCII literal runs at the top level of the pattern (or inside plain groups)
+    are considered; anything optional, repeated or alternated ends the current run.
+    """
+
+    try:
+        parsed = _parser.parse(pattern, flags)
+    except (re.error, OverflowError, RecursionError):
+        return ""
+
+    best = ""
+    run = []
+
+    def walk(items):
+        nonlocal best
+
+        for op, value in items:
+            if op is _constants.LITERAL and value < 128:
+                run.append(chr(value))
+            elif op is _constants.AT:
+                # Anchors are zero-width, so the literals around them are still adjacent
+                continue
+            elif op is _constants.SUBPATTERN and not value[1] and not value[2]:
+                walk(value[-1])
+            else:
+                if len(run) > len(best):
+                    best = "".join(run)
+                run.clear()
+
+    walk(parsed)
+
+    if len(run) > len(best):
+        best = "".join(run)
+
+    best = best.casefold()[:MAX_LITERAL_LENGTH]
+
+    return best if len(best) >= 2 else ""
+
+def trie_regex(literals: Iterable[str]) -> str:
+    """Builds a regex matching any of the literals, shaped as a prefix trie."""
+
+    root = {}
+
+    for literal in literals:
+        node = root
+
+        for char in literal:
+            node = node.setdefault(char, {})
+
+        node[""] = {}
+
+    def build(node) -> str:
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+
+        if not alternatives:
+            return ""
+
+        optional = "" in node
+
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+
+        return "(?:{}){}".format("|".join(alternatives), "?" if optional else "")
+
+    return build(root)
+
+# Compiled sets each worker keeps; the least recently used is dropped first
+WORKER_SETS = 8
+
+# Workers are forked from a forkserver, a fresh process that imports the entry script
+# and this module once, never from the bot itself, whose gateway threads may hold locks
+MATCH_CONTEXT = multiprocessing.get_context("forkserver")
+MATCH_CONTEXT.set_forkserver_preload(["__main__", __name__])
+
+# A registered set, as (set id, entries, flags)
+RegisteredSet = tuple[int, tuple[tuple[Hashable, str], ...], int]
+
+# Worker-side sets by id, compiled by `prepare_pattern_sets` outside any match budget
+worker_sets: dict[int, PatternSet] = {}
+
+def prepare_pattern_sets(sets: list[RegisteredSet], dropped: list[int]):
+    """Worker-side: compiles sets once, so matches against them only pay for matching."""
+
+    for set_id in dropped:
+        worker_sets.pop(set_id, None)
+
+    for set_id, entries, flags in sets:
+        worker_sets[set_id] = PatternSet(entries, flags)
+
+def run_pattern_sets(set_ids: list[int], content: str) -> list[PatternMatch | None]:
+    """Worker-side entry point of `RegexGuard`: the first matching rule of each set."""
+    return [worker_sets[set_id].search(content) for set_id in set_ids]
+
+def runnable_rules(set_ids: list[int], content: str) -> list[list[int]]:
+    return [worker_sets[set_id].runnable(content) for set_id in set_ids]
+
+def run_pattern_rule(set_id: int, index: int, content: str) -> bool:
+    return worker_sets[set_id].compiled[index].search(content) is not None
+
+class MatchWorker:
+    """A single-process pool, so the parent knows its process and which sets it has compiled."""
+
+    def __init__(self):
+        self.pool: ProcessPoolExecutor | None = None
+        self.pid: int | None = None
+        self.sets: list[int] = []
+
+    async def start(self):
+        if self.pool is not None:
+            return
+
+        self.pool = ProcessPoolExecutor(1, mp_context=MATCH_CONTEXT)
+
+        try:
+            # Starts the process before any budget applies, and learns which process to kill
+            self.pid = await asyncio.get_running_loop().run_in_executor(self.pool, os.getpid)
+        except BaseException:
+            self.kill()
+            raise
+
+    async def call(self, function, *args, budget: float | None = None):
+        await self.start()
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+            if budget is None:
+                return await future
+
+            return await asyncio.wait_for(future, budget)
+        except (asyncio.TimeoutError, asyncio.CancelledError, BrokenProcessPool):
+            self.kill()
+            raise
+
+    async def prepare(self, sets: list[RegisteredSet]):
+        for set_id, _, _ in sets:
+            if set_id in self.sets:
+                self.sets.remove(set_id)
+                self.sets.append(set_id)
+
+        missing = [pattern_set for pattern_set in sets if pattern_set[0] not in self.sets]
+
+        if not missing:
+            return
+
+        # The sets in use are the most recent, so only older ones are dropped
+        dropped = self.sets[:max(0, len(self.sets) + len(missing) - WORKER_SETS)]
+
+        # Compiling a large set is slow but bounded, so it runs without a budget
+        await self.call(prepare_pattern_sets, missing, dropped)
+
+        del self.sets[:len(dropped)]
+        self.sets.extend(set_id for set_id, _, _ in missing)
+
+    def kill(self):
+        pool, self.pool = self.pool, None
+        pid, self.pid = self.pid, None
+        self.sets.clear()
+
+        if pool is None:
+            return
+
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        # A runaway match never yields, so its process has to be killed outright
+        if pid is not None:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+class RegexGuard:
+    """Runs stored patterns in worker processes under a per-match time budget.
+
+    `re` cannot be interrupted once it starts backtracking, so matching happens
+    in worker processes and a worker that overruns its budget is killed. Each
+    worker compiles a set once, without a budget, so only matching is timed, and
+    every set a message is checked against goes to the worker in a single call.
+    The rules an overrunning match ran are then probed one by one; a rule that
+    overruns on its own is struck, and after `QUARANTINE_STRIKES` strikes it is
+    quarantined and no longer matched until the bot restarts.
+    """
+
+    def __init__(self, budget: float = MATCH_BUDGET, strikes: int = QUARANTINE_STRIKES, workers: int = MATCH_WORKERS):
+        self.budget = budget
+        self.max_strikes = strikes
+        self.strikes: Counter = Counter()
+        self.quarantined: dict[Hashable, str] = {}
+        self.set_ids: OrderedDict[tuple, int] = OrderedDict()
+        self.next_set_id = 0
+        # A match holds a whole worker, so the budget never includes queueing
+        self.idle: asyncio.Queue[MatchWorker] = asyncio.Queue()
+
+        for _ in range(workers):
+            self.idle.put_nowait(MatchWorker())
+
+    async def start(self):
+        """Starts every worker process ahead of the first message."""
+
+        workers = [self.idle.get_nowait() for _ in range(self.idle.qsize())]
+
+        try:
+            await asyncio.gather(*(worker.start() for worker in workers))
+        finally:
+            for worker in workers:
+                self.idle.put_nowait(worker)
+
+    async def search(self, sets: dict[str, Iterable[tuple[Hashable, str]]], content: str, flags: int = re.IGNORECASE) -> tuple[dict[str, PatternMatch | None], list[tuple[Hashable, str]]]:
+        """Returns the first matching rule of each named set, and any rules quarantined along the way."""
+
+        results = dict.fromkeys(sets)
+        registered = self._register_sets(sets, flags)
+
+        if not registered:
+            return results, []
+
+        try:
+            results.update(await self._search(registered, content))
+            return results, []
+        except asyncio.TimeoutError:
+            pass
+
+        # Compiling is never timed, so the overrun was the matching itself
+        slow = await self._probe(list(registered.values()), content)
+        quarantined = []
+
+        for key, pattern in slow:
+            self.strikes[key] += 1
+
+            if self.strikes[key] >= self.max_strikes:
+                self.quarantined[key] = pattern
+                quarantined.append((key, pattern))
+
+        # Without a slow rule to leave out, the same sets would only overrun again
+        if not slow:
+            return results, quarantined
+
+        retry = self._register_sets(sets, flags, {key for key, _ in slow})
+
+        try:
+            results.update(await self._search(retry, content))
+        except asyncio.TimeoutError:
+            pass
+
+        return results, quarantined
+
+    async def _search(self, registered: dict[str, RegisteredSet], content: str) -> dict[str, PatternMatch | None]:
+        if not registered:
+            return {}
+
+        sets = list(registered.values())
+        found = await self.run(run_pattern_sets, [set_id for set_id, _, _ in sets], content, budget=self.budget * len(sets), prepare=sets)
+
+        return dict(zip(registered, found))
+
+    async def _probe(self, sets: list[RegisteredSet], content: str) -> list[tuple[Hashable, str]]:
+        # Only the rules the prefilters let through ran, so only those can be slow
+        try:
+            runnable = await self.run(runnable_rules, [set_id for set_id, _, _ in sets], content, prepare=sets)
+        except asyncio.TimeoutError:
+            runnable = [range(len(entries)) for _, entries, _ in sets]
+
+        slow = []
+
+        for pattern_set, indices in zip(sets, runnable):
+            for index in indices:
+                try:
+                    await self.run(run_pattern_rule, pattern_set[0], index, content, prepare=[pattern_set])
+                except asyncio.TimeoutError:
+                    slow.append(pattern_set[1][index])
+
+        return slow
+
+    def _register_sets(self, sets: dict[str, Iterable[tuple[Hashable, str]]], flags: int, excluded: set = frozenset()) -> dict[str, RegisteredSet]:
+        registered = {}
+
+        for name, entries in sets.items():
+            # Same filtering as `PatternSet`, so rule indices agree between the two sides
+            entries = tuple(entry for entry in entries if entry[1] and entry[0] not in self.quarantined and entry[0] not in excluded)
+
+            if entries:
+                registered[name] = self._register(entries, flags)
+
+        return registered
+
+    def _register(self, entries: tuple[tuple[Hashable, str], ...], flags: int) -> RegisteredSet:
+        """Returns the set as workers know it, reusing the id of an unchanged set."""
+
+        key = (entries, flags)
+        set_id = self.set_ids.get(key)
+
+        if set_id is None:
+            set_id = self.set_ids[key] = self.next_set_id
+            self.next_set_id += 1
+
+            if len(self.set_ids) > WORKER_SETS:
+                self.set_ids.popitem(last=False)
+        else:
+            self.set_ids.move_to_end(key)
+
+        return set_id, entries, flags
+
+    async def run(self, function, *args, budget: float | None = None, prepare: list[RegisteredSet] | None = None):
+        """Runs a picklable function in a worker, raising `asyncio.TimeoutError` past the budget.
+
+        `prepare` lists sets the worker compiles first, outside the budget.
+        """
+
+        worker = await self.idle.get()
+
+        try:
+            for attempt in range(2):
+                try:
+                    if prepare:
+                        await worker.prepare(prepare)
+
+                    return await worker.call(function, *args, budget=budget or self.budget)
+                except BrokenProcessPool:
+                    # The process died outside a timeout, so retry once on a fresh one
+                    if attempt:
+                        raise asyncio.TimeoutError()
+        finally:
+            self.idle.put_nowait(worker)
+
+regex_guard = RegexGuard()
+
+class RegexReport:
+    def __init__(self, findings: list[str], cost: float, timed_out: bool = False):
+        self.findings = findings
+        self.cost = cost
+        self.timed_out = timed_out
+
+    @property
+    def rejected(self) -> bool:
+        return self.timed_out or self.cost >= REJECT_COST
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.findings) or self.cost >= WARN_COST
+
+    def describe(self) -> str:
+        cost = "over {:.0f}ms".format(ANALYSIS_BUDGET * 1000) if self.timed_out else "{:.1f}ms".format(self.cost * 1000)
+        if self.findings:
+            findings = ", ".join(self.findings)
+        elif self.rejected:
+            findings = "backtracks heavily, though no known risky construct was recognised"
+        else:
+            findings = "no risky constructs found"
+
+        return "{} (worst case {} on adversarial input)".format(findings, cost)
+
+async def analyze_regex(pattern: str, flags: int = re.IGNORECASE) -> RegexReport:
+    """Flags ReDoS-prone shapes in a pattern and measures it against adversarial inputs.
+
+    The pattern must already compile. Building the inputs and measuring both run in
+    `regex_guard`'s workers, so even a catastrophic pattern only costs `ANALYSIS_BUDGET` seconds.
+    """
+
+    findings = []
+    find_redos_shapes(_parser.parse(pattern, flags), bool(flags & re.IGNORECASE), findings, [])
+    findings = sorted(set(findings))
+
+    try:
+        cost = await regex_guard.run(time_pattern, pattern, flags, budget=ANALYSIS_BUDGET)
+    except asyncio.TimeoutError:
+        return RegexReport(findings, ANALYSIS_BUDGET, True)
+
+    return RegexReport(findings, cost)
+
+def time_pattern(pattern: str, flags: int) -> float:
+    """Worker-side: returns the slowest search of the pattern over its adversarial inputs."""
+
+    parsed = _parser.parse(pattern, flags)
+    targets = []
+
+    find_redos_shapes(parsed, bool(flags & re.IGNORECASE), [], targets)
+
+    inputs = ["a" * ADVERSARIAL_LENGTH]
+
+    for target in targets:
+        for suffix in ("!", "\x00"):
+            inputs.append(sample_until(parsed, target, ADVERSARIAL_LENGTH - 1) + suffix)
+
+    compiled = re.compile(pattern, flags)
+    worst = 0.0
+
+    for content in inputs:
+        start = time.perf_counter()
+        compiled.search(content)
+        worst = max(worst, time.perf_counter() - start)
+
+    return worst
+
+REPEATS = (_constants.MAX_REPEAT, _constants.MIN_REPEAT)
+
+def is_wide_repeat(op, value) -> bool:
+    return op in REPEATS and value[0] != value[1] and (value[1] == _constants.MAXREPEAT or value[1] > 16)
+
+def find_redos_shapes(items, ignore_case: bool, findings: list[str], targets: list):
+    """Collects ReDoS-prone shapes, and the repeats to pump when benchmarking them.
+
+    Atomic groups and possessive repeats never backtrack into themselves, so they
+    are not descended into.
+    """
+
+    previous = None
+
+    for item in items:
+        op, value = item
+
+        if op in REPEATS:
+            body = value[2]
+
+            if is_wide_repeat(op, value):
+                targets.append(item)
+
+                if contains_variable_repeat(body):
+                    findings.append("nested quantifiers")
+
+                for inner_op, inner_value in group_items(body):
+                    if inner_op is not _constants.BRANCH:
+                        continue
+
+                    # sre factors a shared prefix out of alternatives, so (a|aa) arrives as
+                    # a(?:|a); an empty alternative left behind means they overlapped
+                    if branches_overlap(inner_value[1], ignore_case) or any(first_chars(branch, ignore_case)[1] for branch in inner_value[1]):
+                        findings.append("overlapping alternation under a quantifier")
+
+                if previous and overlaps(first_chars(previous[1][2], ignore_case)[0], first_chars(body, ignore_case)[0]):
+                    findings.append("adjacent overlapping quantifiers")
+
+            find_redos_shapes(body, ignore_case, findings, targets)
+        elif op is _constants.SUBPATTERN:
+            find_redos_shapes(value[-1], ignore_case, findings, targets)
+        elif op is _constants.BRANCH:
+            for branch in value[1]:
+                find_redos_shapes(branch, ignore_case, findings, targets)
+        elif op in (_constants.ASSERT, _constants.ASSERT_NOT):
+            find_redos_shapes(value[1], ignore_case, findings, targets)
+
+        previous = item if is_wide_repeat(op, value) else None
+
+def group_items(items) -> Iterator:
+    """Yields the items, looking through groups."""
+
+    for op, value in items:
+        if op is _constants.SUBPATTERN:
+            yield from group_items(value[-1])
+        else:
+            yield op, value
+
+def contains_variable_repeat(items) -> bool:
+    for op, value in items:
+        if op in REPEATS and value[0] != value[1]:
+            return True
+        if op is _constants.SUBPATTERN and contains_variable_repeat(value[-1]):
+            return True
+        if op is _constants.BRANCH and any(contains_variable_repeat(branch) for branch in value[1]):
+            return True
+
+    return False
+
+def branches_overlap(branches, ignore_case: bool) -> bool:
+    firsts = [first_chars(branch, ignore_case)[0] for branch in branches]
+    return any(overlaps(firsts[i], firsts[j]) for i in range(len(firsts)) for j in range(i + 1, len(firsts)))
+
+def overlaps(left: set | None, right: set | None) -> bool:
+    # None stands for "any character"
+    if left is None or right is None:
+        return True
+    return bool(left & right)
+
+def first_chars(items, ignore_case: bool) -> tuple[set | None, bool]:
+    """Returns the characters a match of the items can start with, and whether it can be empty."""
+
+    chars = set()
+
+    for op, value in items:
+        if op is _constants.LITERAL:
+            item_chars, nullable = {chr(value)}, False
+        elif op is _constants.IN:
+            item_chars, nullable = in_chars(value), False
+        elif op in (_constants.AT, _constants.ASSERT, _constants.ASSERT_NOT):
+            item_chars, nullable = set(), True
+        elif op is _constants.SUBPATTERN:
+            item_chars, nullable = first_chars(value[-1], ignore_case)
+        elif op is _constants.ATOMIC_GROUP:
+            item_chars, nullable = first_chars(value, ignore_case)
+        elif op in REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            item_chars, nullable = first_chars(value[2], ignore_case)
+            nullable = nullable or value[0] == 0
+        elif op is _constants.BRANCH:
+            item_chars, nullable = set(), False
+
+            for branch in value[1]:
+                branch_chars, branch_nullable = first_chars(branch, ignore_case)
+
+                if branch_chars is None:
+                    item_chars = None
+                elif item_chars is not None:
+                    item_chars |= branch_chars
+
+                nullable = nullable or branch_nullable
+        else:
+            return None, False
+
+        if item_chars is None:
+            return None, False
+
+        chars |= item_chars
+
+        if not nullable:
+            break
+    else:
+        nullable = True
+
+    if ignore_case:
+        chars |= {char.lower() for char in chars} | {char.upper() for char in chars}
+
+    return chars, nullable
+
+def in_chars(members) -> set | None:
+    chars = set()
+
+    for op, value in members:
+        if op is _constants.LITERAL:
+            chars.add(chr(value))
+        elif op is _constants.RANGE and value[1] - value[0] < 256:
+            chars.update(chr(code) for code in range(value[0], value[1] + 1))
+        else:
+            return None
+
+    return chars
+
+SAMPLE_CANDIDATES = "a0 _-!.A\n"
+
+CATEGORY_SAMPLES = {
+    _constants.CATEGORY_DIGIT: "1",
+    _constants.CATEGORY_NOT_DIGIT: "a",
+    _constants.CATEGORY_SPACE: " ",
+    _constants.CATEGORY_NOT_SPACE: "a",
+    _constants.CATEGORY_WORD: "a",
+    _constants.CATEGORY_NOT_WORD: "!",
+}
+
+CATEGORY_PATTERNS = {
+    _constants.CATEGORY_DIGIT: re.compile(r"\d"),
+    _constants.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    _constants.CATEGORY_SPACE: re.compile(r"\s"),
+    _constants.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    _constants.CATEGORY_WORD: re.compile(r"\w"),
+    _constants.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+class SampleReached(Exception):
+    def __init__(self, sample: str):
+        self.sample = sample
+
+class Sample:
+    """Text built while walking a pattern, which stops growing at `length` characters."""
+
+    def __init__(self, length: int):
+        self.length = length
+        self.parts: list[str] = []
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.length
+
+    def append(self, text: str):
+        self.parts.append(text)
+        self.size += len(text)
+
+    def __str__(self) -> str:
+        return "".join(self.parts)
+
+def sample_until(items, target, length: int) -> str:
+    """Builds a string that walks the pattern up to `target`, then pumps it to `length`.
+
+    The input ends right after the pumped repeat, so the rest of the pattern fails and
+    the engine is forced to try every way of splitting the pumped text.
+    """
+
+    try:
+        sample_items(items, target, Sample(length))
+    except SampleReached as reached:
+        return reached.sample[:length]
+
+    return "a" * length
+
+def sample_items(items, target, out: Sample):
+    for item in items:
+        # Nested bounded repeats multiply, so stop once the input is long enough
+        if out.full:
+            return
+
+        op, value = item
+
+        if item is target:
+            body = Sample(out.length)
+            sample_items(value[2], None, body)
+            pump = str(body) or "a"
+            prefix = str(out)
+            raise SampleReached(prefix + pump * max(1, (out.length - len(prefix)) // len(pump)))
+
+        if op is _constants.LITERAL:
+            out.append(chr(value))
+        elif op is _constants.NOT_LITERAL:
+            out.append("b" if chr(value) == "a" else "a")
+        elif op is _constants.ANY:
+            out.append("a")
+        elif op is _constants.IN:
+            out.append(sample_in(value))
+        elif op is _constants.CATEGORY:
+            out.append(CATEGORY_SAMPLES.get(value, "a"))
+        elif op is _constants.SUBPATTERN:
+            sample_items(value[-1], target, out)
+        elif op is _constants.ATOMIC_GROUP:
+            sample_items(value, target, out)
+        elif op is _constants.BRANCH:
+            # Explore every branch so a target inside a later one is still reached
+            for branch in value[1][1:]:
+                sample_items(branch, target, Sample(out.length))
+
+            sample_items(value[1][0], target, out)
+        elif op in REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            for _ in range(max(value[0], 1)):
+                size = out.size
+                sample_items(value[2], target, out)
+
+                # A body that adds nothing would only spin, however large the count
+                if out.full or out.size == size:
+                    break
+        elif op is _constants.GROUPREF_EXISTS:
+            sample_items(value[1], target, out)
+
+def sample_in(members) -> str:
+    negate = members and members[0][0] is _constants.NEGATE
+
+    for char in SAMPLE_CANDIDATES:
+        if in_member(members, char) != negate:
+            return char
+
+    for op, value in members:
+        if op is _constants.LITERAL:
+            return chr(value)
+        if op is _constants.RANGE:
+            return chr(value[0])
+
+    return "a"
+
+def in_member(members, char: str) -> bool:
+    for op, value in members:
+        if op is _constants.LITERAL and chr(value) == char:
+            return True
+        if op is _constants.RANGE and value[0] <= ord(char) <= value[1]:
+            return True
+        if op is _constants.CATEGORY and value in CATEGORY_PATTERNS and CATEGORY_PATTERNS[value].fullmatch(char):
+            return True
+
+    return False
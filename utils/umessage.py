@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import sys
+
+import discord
+from discord.ext import commands
+from db.models import GuildData
+
+from utils.uguild import get_guild_data
+from utils.umatch import PatternMatch
+
+class MessageContext:
+    """Per-message state shared by every stage of the message pipeline.
+
+    Args:
+        message (discord.Message): The current message.
+        command (bool): Whether the message invokes a valid command.
+        guild_data (GuildData): Settings of the guild the message was sent in.
+    """
+
+    def __init__(self, message: discord.Message, command: bool, guild_data: GuildData):
+        self.message = message
+        self.command = command
+        self.guild_data = guild_data
+        self.content = message.content
+        # First matching rule per pattern set ("filter", "monitor", "tag"), filled in one worker call
+        self.matches: dict[str, PatternMatch | None] = {}
+
+async def build_message_context(bot: commands.Bot, message: discord.Message) -> MessageContext:
+    ctx = await bot.get_context(message)
+    guild_data = await get_guild_data(message.guild)
+
+    return MessageContext(message, ctx.valid, guild_data)
+
+# Rough per-entry cost of the slots object, its ints and the OrderedDict node
+STORED_MESSAGE_OVERHEAD = 240
+
+class StoredMessage:
+    __slots__ = ("message_id", "channel_id", "author_id", "content", "attachments")
+
+    def __init__(self, message_id: int, channel_id: int, author_id: int, content: str, attachments: tuple[str, ...]):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.content = content
+        self.attachments = attachments
+
+    @property
+    def size(self) -> int:
+        return STORED_MESSAGE_OVERHEAD + sys.getsizeof(self.content) + sum(sys.getsizeof(url) for url in self.attachments)
+
+class MessageStore:
+    """LRU of the few message fields edit/delete logging needs, capped in bytes.
+
+    Keeping only IDs, content and attachment URLs lets far more history fit in
+    the same memory than discord.py's cache of full `Message` objects.
+
+    Args:
+        max_bytes (int): Approximate memory budget; least recently seen messages are evicted past it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.messages: OrderedDict[int, StoredMessage] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add(self, message: discord.Message):
+        self.put(StoredMessage(
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.content,
+            tuple(attachment.url for attachment in message.attachments),
+        ))
+
+    def put(self, stored: StoredMessage):
+        self.pop(stored.message_id)
+
+        self.messages[stored.message_id] = stored
+        self.size += stored.size
+
+        while self.size > self.max_bytes and self.messages:
+            _, evicted = self.messages.popitem(last=False)
+            self.size -= evicted.size
+
+    def get(self, message_id: int) -> StoredMessage | None:
+        return self.messages.get(message_id)
+
+    def pop(self, message_id: int) -> StoredMessage | None:
+        stored = self.messages.pop(message_id, None)
+
+        if stored:
+            self.size -= stored.size
+
+        return stored
+
+    def update_content(self, message_id: int, content: str):
+        stored = self.get(message_id)
+
+        if stored:
+            self.put(StoredMessage(stored.message_id, stored.channel_id, stored.author_id, content, stored.attachments))
@@ -0,0 +1,221 @@
+import asyncio
+from datetime import datetime, timedelta
+import heapq
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy import tuple_
+
+from db.models import GuildScheduledJob
+
+logger = logging.getLogger(__name__)
+
+# Jobs due within this window are held in memory; later ones stay in Postgres until a refill reaches them
+WINDOW = timedelta(hours=1)
+# Most jobs read per refill; the next batch is read once the heap drains below a quarter of this
+REFILL_BATCH = 500
+# Runs a failing job gets before it is dropped, with the delay doubling after each failure
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = timedelta(minutes=1)
+
+JobHandler = Callable[[list[GuildScheduledJob]], Awaitable[list[GuildScheduledJob] | None]]
+
+class Scheduler:
+    """Single timer service for every delayed action (reminders, vote and punishment expiry).
+
+    Jobs live in the `scheduled_job` table, so they survive restarts. They are
+    streamed into a heap in (due, job_id) order, at most `REFILL_BATCH` at a
+    time and never past `WINDOW` ahead, and one task sleeps until the earliest.
+    Every job due at wake-up is handed to its kind's handler in a single batch
+    and deleted in one statement. After downtime, missed jobs are all due, so
+    they fire batch by batch as fast as the refills read them. A job whose
+    handler fails stays in the table and is retried with exponential backoff,
+    up to `MAX_ATTEMPTS` runs.
+    """
+
+    def __init__(self, window: timedelta = WINDOW):
+        self.window = window
+        self.handlers: dict[str, JobHandler] = {}
+        self.heap: list[tuple[datetime, int, GuildScheduledJob]] = []
+        self.queued: set[int] = set()
+        self.horizon = datetime.min
+        # (due, job_id) of the last job read, and whether every job up to the horizon has been read
+        self.cursor: tuple[datetime, int] | None = None
+        self.exhausted = True
+        self.lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def register(self, kind: str, handler: JobHandler):
+        """Sets the coroutine awaited with each batch of due jobs of a kind.
+
+        The handler returns the jobs that failed, if any; raising fails the whole batch.
+        """
+
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def schedule(self, kind: str, due: datetime, payload: dict) -> GuildScheduledJob:
+        job = await GuildScheduledJob.create(kind=kind, due=due, payload=payload)
+
+        # Jobs past what has been read are picked up by a later refill. The lock keeps
+        # a refill from moving the cursor past this job before it is compared.
+        async with self.lock:
+            if self._loaded(job):
+                self._push(job)
+
+        return job
+
+    def _loaded(self, job: GuildScheduledJob) -> bool:
+        if self.exhausted:
+            return job.due <= self.horizon
+
+        return self.cursor is not None and (job.due, job.job_id) <= self.cursor
+
+    def _push(self, job: GuildScheduledJob):
+        if job.job_id in self.queued:
+            return
+
+        self.queued.add(job.job_id)
+        heapq.heappush(self.heap, (job.due, job.job_id, job))
+
+        # A new earliest job shortens the current sleep
+        if self.heap[0][1] == job.job_id:
+            self.wake.set()
+
+    async def _refill(self, horizon: datetime):
+        async with self.lock:
+            query = GuildScheduledJob.query.where(GuildScheduledJob.due <= horizon)
+
+            # Keyset pagination: each refill is an index range scan starting after the last job read
+            if self.cursor:
+                query = query.where(tuple_(GuildScheduledJob.due, GuildScheduledJob.job_id) > self.cursor)
+
+            jobs = await query.order_by(GuildScheduledJob.due, GuildScheduledJob.job_id).limit(REFILL_BATCH).gino.all()
+
+            for job in jobs:
+                self._push(job)
+
+            if jobs:
+                self.cursor = (jobs[-1].due, jobs[-1].job_id)
+
+            self.horizon = horizon
+            self.exhausted = len(jobs) < REFILL_BATCH
+
+    async def _run(self):
+        refill_at = datetime.min
+
+        while True:
+            now = datetime.utcnow()
+
+            # Extend the horizon halfway through the window, so a slow refill never leaves a gap
+            extend = now >= refill_at
+            draining = not self.exhausted and len(self.heap) < REFILL_BATCH // 4
+
+            if extend or draining:
+                try:
+                    await self._refill(now + self.window if extend else self.horizon)
+
+                    if extend:
+                        refill_at = now + self.window / 2
+                except Exception as e:
+                    logger.warning("Failed to load scheduled jobs: {}".format(e))
+                    # Stop draining until the retry, which resumes from the same cursor
+                    self.exhausted = True
+                    refill_at = now + timedelta(minutes=1)
+
+            due = []
+
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap)[2])
+
+            if due:
+                await self._fire(due)
+                continue
+
+            wake_at = min(self.heap[0][0], refill_at) if self.heap else refill_at
+            self.wake.clear()
+
+            try:
+                await asyncio.wait_for(self.wake.wait(), (wake_at - now).total_seconds())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, jobs: list[GuildScheduledJob]):
+        batches: dict[str, list[GuildScheduledJob]] = {}
+
+        for job in jobs:
+            batches.setdefault(job.kind, []).append(job)
+
+        results = await asyncio.gather(*(self._handle(kind, batch) for kind, batch in batches.items()))
+        done, failed = [], []
+
+        for failures, batch in zip(results, batches.values()):
+            # Jobs without a handler are left in the table and retried on the next start
+            if failures is None:
+                continue
+
+            failed_ids = {job.job_id for job in failures}
+
+            for job in batch:
+                (failed if job.job_id in failed_ids else done).append(job)
+
+        self.queued.difference_update(job.job_id for job in jobs)
+
+        if done:
+            try:
+                await GuildScheduledJob.delete.where(GuildScheduledJob.job_id.in_([job.job_id for job in done])).gino.status()
+            except Exception as e:
+                logger.warning("Failed to delete {} finished jobs: {}".format(len(done), e))
+
+        if failed:
+            await self._retry(failed)
+
+    async def _handle(self, kind: str, jobs: list[GuildScheduledJob]) -> list[GuildScheduledJob] | None:
+        handler = self.handlers.get(kind)
+
+        if not handler:
+            logger.warning("No handler for {} due {} job(s).".format(len(jobs), kind))
+            return None
+
+        try:
+            return list(await handler(jobs) or [])
+        except Exception as e:
+            logger.warning("Handler for {} job(s) failed: {}".format(kind, e))
+            return jobs
+
+    async def _retry(self, jobs: list[GuildScheduledJob]):
+        now = datetime.utcnow()
+        dropped = [job for job in jobs if job.attempts + 1 >= MAX_ATTEMPTS]
+
+        for job in jobs:
+            if job.attempts + 1 >= MAX_ATTEMPTS:
+                continue
+
+            try:
+                # Stored, so the backoff survives a restart too
+                await job.update(due=now + RETRY_BACKOFF * 2 ** job.attempts, attempts=job.attempts + 1).apply()
+            except Exception as e:
+                # Still in the table at its old due time, so the next start runs it
+                logger.warning("Failed to reschedule {} job {}: {}".format(job.kind, job.job_id, e))
+                continue
+
+            async with self.lock:
+                if self._loaded(job):
+                    self._push(job)
+
+        if dropped:
+            logger.warning("Dropping {} job(s) after {} failed attempts: {}".format(len(dropped), MAX_ATTEMPTS, ", ".join("{} {}".format(job.kind, job.payload) for job in dropped)))
+
+            try:
+                await GuildScheduledJob.delete.where(GuildScheduledJob.job_id.in_([job.job_id for job in dropped])).gino.status()
+            except Exception as e:
+                logger.warning("Failed to delete {} dropped jobs: {}".format(len(dropped), e))
+
+        if len(dropped) < len(jobs):
+            logger.info("Retrying {} failed job(s) with backoff.".format(len(jobs) - len(dropped)))
+
+scheduler = Scheduler()
@@ -0,0 +1,82 @@
+from collections import Counter
+import re
+from typing import Hashable
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# Share of the query's trigrams an entry must contain to be returned
+SIMILARITY_THRESHOLD = 0.5
+
+def trigrams(text: str) -> set[str]:
+    """Returns the trigrams of a text the way pg_trgm does: per lowercased word, padded with spaces."""
+
+    grams = set()
+
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = "  {} ".format(word)
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+class TrigramIndex:
+    """Inverted trigram index returning entries ranked by similarity to a query.
+
+    Entries containing the query as a substring always rank first, so exact
+    lookups behave as before. The rest are ranked by the share of the query's
+    trigrams they contain (like pg_trgm's `word_similarity`, so short queries
+    still find long triggers), then by whole-text similarity.
+    """
+
+    def __init__(self):
+        self.texts: dict[Hashable, str] = {}
+        self.grams: dict[Hashable, set[str]] = {}
+        self.postings: dict[str, set[Hashable]] = {}
+
+    def add(self, key: Hashable, text: str):
+        self.remove(key)
+
+        self.texts[key] = text
+        self.grams[key] = trigrams(text)
+
+        for gram in self.grams[key]:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: Hashable):
+        if key not in self.texts:
+            return
+
+        for gram in self.grams.pop(key):
+            keys = self.postings[gram]
+            keys.discard(key)
+
+            if not keys:
+                del self.postings[gram]
+
+        del self.texts[key]
+
+    def search(self, query: str, limit: int = 100, threshold: float = SIMILARITY_THRESHOLD) -> list[Hashable]:
+        needle = query.lower()
+        query_grams = trigrams(query)
+        shared = Counter()
+
+        for gram in query_grams:
+            for key in self.postings.get(gram, ()):
+                shared[key] += 1
+
+        # Queries too short (or too symbolic) to share an inner trigram can still be substrings
+        candidates = self.texts if len(needle) < 3 or not query_grams else shared
+
+        ranked = []
+
+        for key in candidates:
+            count = shared[key]
+            coverage = count / len(query_grams) if query_grams else 0.0
+            similarity = count / (len(query_grams) + len(self.grams[key]) - count) if count else 0.0
+            substring = needle in self.texts[key].lower()
+
+            if substring or coverage >= threshold:
+                ranked.append((not substring, -coverage, -similarity, self.texts[key], key))
+
+        ranked.sort()
+
+        return [key for *_, key in ranked[:limit]]
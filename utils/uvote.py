@@ -0,0 +1,91 @@
+import asyncio
+from collections import Counter
+import logging
+from typing import Awaitable, Callable
+
+from db.models import GuildVote
+
+logger = logging.getLogger(__name__)
+
+UPVOTE = "\N{THUMBS UP SIGN}"
+DOWNVOTE = "\N{THUMBS DOWN SIGN}"
+
+async def increment_vote(message_id: int, positive: int = 0, negative: int = 0) -> GuildVote | None:
+    """Atomically applies counter deltas to an open vote.
+
+    Returns the updated row, or None if the message is not an open vote.
+    """
+
+    return await GuildVote.update \
+        .values(positive=GuildVote.positive + positive, negative=GuildVote.negative + negative) \
+        .where((GuildVote.message_id == message_id) & (GuildVote.finished == False)) \
+        .returning(*GuildVote.__table__.columns) \
+        .gino.model(GuildVote).first()
+
+class VoteAggregator:
+    """Coalesces reaction deltas per vote and writes them every `interval` seconds.
+
+    For very hot votes this turns a burst of reactions into one UPDATE per
+    vote per interval. The trade-off is that counts lag by up to one
+    interval, and pending deltas are lost if the bot stops mid-interval.
+
+    Args:
+        interval (float): Seconds between flushes.
+        on_update (Callable): Awaited with each vote a flush changed, with its new counts.
+    """
+
+    def __init__(self, interval: float, on_update: Callable[[GuildVote], Awaitable] | None = None):
+        self.interval = interval
+        self.on_update = on_update
+        self.pending: dict[int, list[int]] = {}
+        self.task: asyncio.Task | None = None
+        self.stats = Counter(reactions=0, writes=0, failures=0)
+
+    def add(self, message_id: int, positive: int = 0, negative: int = 0):
+        delta = self.pending.setdefault(message_id, [0, 0])
+        delta[0] += positive
+        delta[1] += negative
+        self.stats["reactions"] += 1
+
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            for vote_entry in await self.flush():
+                if not self.on_update:
+                    continue
+
+                try:
+                    await self.on_update(vote_entry)
+                except Exception as e:
+                    logger.warning("Failed to process flushed vote {}: {}".format(vote_entry.vote_id, e))
+
+    async def flush(self) -> list[GuildVote]:
+        pending, self.pending = self.pending, {}
+        updated = []
+
+        for message_id, (positive, negative) in pending.items():
+            # Reactions that cancelled out within the interval need no write
+            if not positive and not negative:
+                continue
+
+            try:
+                vote_entry = await increment_vote(message_id, positive, negative)
+            except Exception as e:
+                # Put the delta back so the next flush retries it
+                self.stats["failures"] += 1
+                delta = self.pending.setdefault(message_id, [0, 0])
+                delta[0] += positive
+                delta[1] += negative
+                logger.warning("Failed to flush votes for message {}: {}".format(message_id, e))
+                continue
+
+            self.stats["writes"] += 1
+
+            if vote_entry:
+                updated.append(vote_entry)
+
+        return updated